@@ -0,0 +1,79 @@
+"""
+Answer a file of questions through /query/batch.
+
+    python batch_query.py questions.txt -o answers.ndjson
+    python batch_query.py eval.jsonl --collections hr --concurrency 8 --chunk 500
+
+Input is one question per line, or JSONL with a "question" field. Output is
+one JSON object per line ({"index", "question", "answer", "sources", ...})
+written as answers arrive; --sorted rewrites it in input order at the end.
+"""
+import argparse
+import json
+import sys
+import time
+
+import httpx
+
+
+def read_questions(path):
+    questions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ask many questions through /query/batch")
+    parser.add_argument("questions", help="text file (one question per line) or JSONL with a 'question' field")
+    parser.add_argument("-o", "--output", default=None, help="NDJSON output file (default stdout)")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--collections", nargs="*", default=None)
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None, help="answers generated at once per request")
+    parser.add_argument("--chunk", type=int, default=500, help="questions per request")
+    parser.add_argument("--sorted", action="store_true", help="write results in input order")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    options = {"collections": args.collections, "top_k": args.top_k, "concurrency": args.concurrency}
+    options = {name: value for name, value in options.items() if value is not None}
+    out = open(args.output, "w") if args.output else sys.stdout
+    results = []
+    errors = 0
+    start = time.perf_counter()
+    with httpx.Client(timeout=args.timeout) as client:
+        for offset in range(0, len(questions), args.chunk):
+            payload = {"questions": questions[offset:offset + args.chunk], **options}
+            with client.stream("POST", f"{args.url}/query/batch", json=payload) as response:
+                if response.status_code != 200:
+                    response.read()
+                    raise SystemExit(f"/query/batch failed ({response.status_code}): {response.text}")
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    result = json.loads(line)
+                    result["index"] += offset
+                    errors += "error" in result
+                    if args.sorted:
+                        results.append(result)
+                    else:
+                        out.write(json.dumps(result) + "\n")
+                        out.flush()
+            done = min(offset + args.chunk, len(questions))
+            print(f"{done}/{len(questions)} answered, {done / (time.perf_counter() - start):.2f} questions/sec",
+                  file=sys.stderr)
+    for result in sorted(results, key=lambda r: r["index"]):
+        out.write(json.dumps(result) + "\n")
+    if out is not sys.stdout:
+        out.close()
+    print(f"Done in {time.perf_counter() - start:.1f}s, {errors} errors", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
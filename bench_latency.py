@@ -0,0 +1,79 @@
+"""
+Query latency under concurrency against a running API.
+
+    uvicorn main:app --port 8000
+    python bench_latency.py --url http://localhost:8000 --concurrency 1 8 32 --requests 200
+
+Each level runs `--requests` queries spread over that many concurrent
+clients and prints p50/p99 latency and throughput.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+QUESTIONS = [
+    "What is the leave policy?",
+    "How do I claim travel expenses?",
+    "Who approves purchase orders?",
+    "What are the office working hours?",
+    "How is overtime compensated?",
+    "What is the notice period for resignation?",
+    "How do I reset my password?",
+    "What does the refund policy say?",
+]
+
+
+async def run_level(url, concurrency, total, timeout):
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def client_loop(client):
+        nonlocal errors
+        for i in counter:
+            payload = {"question": QUESTIONS[i % len(QUESTIONS)] + f" ({i})"}
+            start = time.perf_counter()
+            try:
+                r = await client.post(f"{url}/query/", json=payload)
+                r.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure /query/ latency at several concurrency levels")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="queries per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'ok':>6} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for level in args.concurrency:
+        r = await run_level(args.url, level, args.requests, args.timeout)
+        print(f"{r['concurrency']:>8} {r['ok']:>6} {r['errors']:>7} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['rps']:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""
+Cold-start time and per-query embedding latency for each embedding backend.
+
+    python bench_startup.py --backends torch onnx int8 --queries 200 --threads 4
+    python bench_startup.py --app --json startup_report.json
+
+Every backend runs in a fresh interpreter, so model load includes the
+torch / ONNX Runtime import just like a new API worker. Vectors from each
+backend are compared with the first one (mean and minimum cosine) to check
+they are interchangeable. `--app` also times `import main`, which should
+stay small now that models and indexes load lazily.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+QUESTIONS = [
+    "What is the leave policy?",
+    "How do I claim travel expenses?",
+    "Who approves purchase orders?",
+    "What are the office working hours?",
+    "How is overtime compensated?",
+    "What is the notice period for resignation?",
+    "How do I reset my password?",
+    "What does the refund policy say?",
+]
+
+
+def child(backend, queries):
+    """Runs inside the fresh interpreter; prints one JSON line."""
+    from embeddings import load_model
+
+    start = time.perf_counter()
+    model = load_model(backend=backend)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.encode(["first query"], normalize_embeddings=True)
+    first_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for i in range(queries):
+        # Vary the text so nothing downstream can cache it
+        text = f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"
+        start = time.perf_counter()
+        model.encode([text], normalize_embeddings=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = [f"{QUESTIONS[i % len(QUESTIONS)]} passage {i}" for i in range(256)]
+    start = time.perf_counter()
+    model.encode(batch, batch_size=64, normalize_embeddings=True)
+    batch_seconds = time.perf_counter() - start
+
+    vectors = np.asarray(model.encode(QUESTIONS, normalize_embeddings=True), dtype=np.float32)
+    print(json.dumps({
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "first_encode_ms": round(first_ms, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "texts_per_sec": round(len(batch) / batch_seconds, 1),
+        "vectors": vectors.tolist(),
+    }))
+
+
+def run_child(args):
+    env = dict(os.environ)
+    if args.threads:
+        env["OMP_NUM_THREADS"] = str(args.threads)
+    out = subprocess.run(args.command, capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def time_app_import(threads):
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    env = dict(os.environ)
+    if threads:
+        env["OMP_NUM_THREADS"] = str(threads)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        return None
+    return round(float(out.stdout.strip().splitlines()[-1]), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends: cold start and query latency")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "int8"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=None, help="OMP_NUM_THREADS for the runs")
+    parser.add_argument("--app", action="store_true", help="also time `import main`")
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.queries)
+        return
+
+    results = []
+    for backend in args.backends:
+        args.command = [sys.executable, os.path.abspath(__file__), "--child", backend, "--queries", str(args.queries)]
+        result = run_child(args)
+        result.setdefault("backend", backend)
+        results.append(result)
+
+    reference = next((r for r in results if "vectors" in r), None)
+    print(f"{'backend':<8} {'load s':>8} {'first ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'texts/s':>9} {'cos mean':>9} {'cos min':>8}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<8} failed: {r['error']}")
+            continue
+        ref = np.asarray(reference["vectors"])
+        cos = np.sum(ref * np.asarray(r["vectors"]), axis=1)
+        r["cosine_mean"] = round(float(cos.mean()), 5)
+        r["cosine_min"] = round(float(cos.min()), 5)
+        print(f"{r['backend']:<8} {r['load_seconds']:>8.2f} {r['first_encode_ms']:>9.1f} {r['p50_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['texts_per_sec']:>9.1f} {r['cosine_mean']:>9.4f} {r['cosine_min']:>8.4f}")
+
+    report = {"queries": args.queries, "threads": args.threads,
+              "backends": [{k: v for k, v in r.items() if k != "vectors"} for r in results]}
+    if args.app:
+        report["app_import_seconds"] = time_app_import(args.threads)
+        print(f"import main: {report['app_import_seconds']}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Storage modes compared: bytes per vector, memory per worker and recall loss.
+
+    python bench_storage.py                          # vectors from faiss_index.bin
+    python bench_storage.py --synthetic 100000 --modes flat flat_fp16 ivf_sq8 ivf_pq --rerank 4
+    python bench_storage.py --synthetic 50000 --json storage_report.json
+
+Each mode is built from the same vectors and loaded by a fresh process
+through VectorStore, as an API worker would, once plainly and once
+memory-mapped (IVF kinds only). Lossy modes are also measured with exact
+re-scoring. Memory is read from /proc/self/status: `anon` is private to the
+worker, `file` is mapped pages that every worker shares. Recall@k is
+against an exact flat search over the original vectors.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import faiss
+import numpy as np
+
+from index_engine import INDEX_TYPES, LOSSY_TYPES, MMAP_TYPES, extract_vectors
+
+DEFAULT_MODES = ["flat", "flat_fp16", "flat_int8", "pq", "ivf_flat", "ivf_sq8", "ivf_pq"]
+
+
+def memory_kb():
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0])
+    return fields
+
+
+def child(directory, kind, mmap, rerank, k, queries_path):
+    """Runs inside a fresh interpreter; prints one JSON line."""
+    from vector_store import VectorStore
+
+    queries = np.load(queries_path)
+    before = memory_kb()
+    store = VectorStore(os.path.join(directory, "faiss_index.bin"), queries.shape[1], kind,
+                        mmap=mmap, rerank_factor=rerank)
+    store.load()
+    _, ids = store.search(queries, k)
+    after = memory_kb()
+    np.save(os.path.join(directory, "results.npy"), ids)
+    print(json.dumps({
+        "mapped": store.mapped,
+        "rss_kb": after.get("VmRSS", 0) - before.get("VmRSS", 0),
+        "anon_kb": after.get("RssAnon", 0) - before.get("RssAnon", 0),
+        "file_kb": after.get("RssFile", 0) - before.get("RssFile", 0),
+    }))
+
+
+def synthetic_vectors(n, dim, seed=0):
+    # Clustered unit vectors behave more like sentence embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 200, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=n)] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors, np.arange(n, dtype=np.int64)
+
+
+def recall(results, truth):
+    hits = sum(len(set(r[r != -1]) & set(t[t != -1])) for r, t in zip(results, truth))
+    return hits / max(sum(int((t != -1).sum()) for t in truth), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector storage modes")
+    parser.add_argument("--modes", nargs="+", choices=INDEX_TYPES, default=DEFAULT_MODES)
+    parser.add_argument("--index", default="faiss_index.bin", help="take vectors from this index file")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank", type=int, default=4, help="re-scoring factor for lossy modes (0 = skip)")
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    parser.add_argument("--child", nargs=6, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        directory, kind, mmap, rerank, k, queries_path = args.child
+        child(directory, kind, mmap == "1", int(rerank), int(k), queries_path)
+        return
+
+    # Imported here so --child processes start without it
+    from rebuild_index import build_index
+    from vector_store import RawVectors
+
+    if args.synthetic:
+        vectors, ids = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        vectors, ids = extract_vectors(faiss.read_index(args.index))
+        faiss.normalize_L2(vectors)
+    if not len(ids):
+        raise SystemExit("No vectors to benchmark; pass --synthetic N")
+
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    # Perturbed corpus vectors stand in for real questions
+    queries = vectors[picks] + rng.normal(scale=0.05, size=(len(picks), vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    _, truth = build_index(vectors, ids, vectors.shape[1], "flat").search(queries, args.k)
+
+    workdir = tempfile.mkdtemp(prefix="bench_storage_")
+    queries_path = os.path.join(workdir, "queries.npy")
+    np.save(queries_path, queries)
+    rows = []
+    try:
+        for kind in args.modes:
+            directory = os.path.join(workdir, kind)
+            os.makedirs(directory)
+            try:
+                index = build_index(vectors, ids, vectors.shape[1], kind)
+            except SystemExit as e:
+                print(f"{kind}: skipped ({e})")
+                continue
+            path = os.path.join(directory, "faiss_index.bin")
+            faiss.write_index(index, path)
+            bytes_per_vector = os.path.getsize(path) / len(ids)
+            if kind in LOSSY_TYPES and args.rerank:
+                raw = RawVectors(path + ".vectors", vectors.shape[1])
+                raw.write(ids, vectors)
+                raw.flush()
+            variants = [(False, 0)]
+            if kind in MMAP_TYPES:
+                variants.append((True, 0))
+            if kind in LOSSY_TYPES and args.rerank:
+                variants.append((kind in MMAP_TYPES, args.rerank))
+            for mmap, rerank in variants:
+                for name in ("faiss_index.bin.log", "faiss_index.bin.tombstones"):
+                    if os.path.exists(os.path.join(directory, name)):
+                        os.remove(os.path.join(directory, name))
+                command = [sys.executable, os.path.abspath(__file__), "--child", directory, kind,
+                           "1" if mmap else "0", str(rerank), str(args.k), queries_path]
+                out = subprocess.run(command, capture_output=True, text=True)
+                if out.returncode != 0:
+                    print(f"{kind}: failed: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+                    continue
+                stats = json.loads(out.stdout.strip().splitlines()[-1])
+                results = np.load(os.path.join(directory, "results.npy"))
+                rows.append({
+                    "mode": kind,
+                    "mmap": stats["mapped"],
+                    "rerank": rerank,
+                    "bytes_per_vector": round(bytes_per_vector, 1),
+                    "rerank_bytes_per_vector": vectors.shape[1] * 4 if rerank else 0,
+                    # Re-scoring keeps exact float32 vectors next to the index; count them against compression
+                    "total_bytes_per_vector": round(bytes_per_vector + (vectors.shape[1] * 4 if rerank else 0), 1),
+                    "rss_mb": round(stats["rss_kb"] / 1024, 1),
+                    "private_mb": round(stats["anon_kb"] / 1024, 1),
+                    "shared_mb": round(stats["file_kb"] / 1024, 1),
+                    "recall": round(recall(results, truth), 4),
+                })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{len(ids)} vectors, dim {vectors.shape[1]}, recall@{args.k} over {len(queries)} queries")
+    print(f"{'mode':<10} {'mmap':>5} {'rerank':>6} {'index B/v':>9} {'exact B/v':>9} {'total B/v':>9} "
+          f"{'RSS MB':>8} {'private':>8} {'shared':>8} {'recall':>7}")
+    for r in rows:
+        print(f"{r['mode']:<10} {'yes' if r['mmap'] else 'no':>5} {r['rerank'] or '-':>6} {r['bytes_per_vector']:>9.1f} "
+              f"{r['rerank_bytes_per_vector']:>9.1f} {r['total_bytes_per_vector']:>9.1f} "
+              f"{r['rss_mb']:>8.1f} {r['private_mb']:>8.1f} {r['shared_mb']:>8.1f} {r['recall']:>7.4f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"vectors": len(ids), "dim": int(vectors.shape[1]), "k": args.k, "modes": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
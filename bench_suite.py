@@ -0,0 +1,472 @@
+"""
+End-to-end upload and query benchmark that needs no Groq key and no MySQL.
+
+    python bench_suite.py --docs 1000 --concurrency 1 8 32 --json bench_1k.json
+    python bench_suite.py --docs 1000 10000 100000 --stub-embedder --json bench.json
+    python bench_suite.py --docs 1000 --json after.json --compare before.json
+
+For each corpus size a fresh API server (uvicorn in a child process) runs in
+a temporary directory on SQLite, with the Groq client replaced by a stub
+that streams canned tokens after `--llm-ttft-ms`, one every `--llm-token-ms`.
+Synthetic PDFs are posted to /upload/ at `--upload-concurrency` and the
+ingestion queue is drained. Then /query/ (or /query/stream with `--stream`)
+is driven at each concurrency level. The report holds throughput,
+p50/p95/p99 latency, server memory, index size, mean per-stage times from
+/metrics, and the commit it was run against, so runs can be compared.
+`--stub-embedder` swaps the model for a hashing embedder, to measure
+everything except the model.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+
+TOPICS = [
+    "leave", "travel", "payroll", "security", "onboarding", "procurement", "refunds", "overtime",
+    "training", "equipment", "privacy", "benefits", "recruitment", "compliance", "facilities", "retention",
+]
+SYLLABLES = ["ka", "lo", "mi", "ser", "tan", "vo", "rel", "dif", "pra", "gun", "est", "bor", "nal", "qui", "ten", "ax"]
+CANNED_ANSWER = (
+    "<think>Checking the passages for the relevant clause.</think>"
+    "According to the policy document, requests must be submitted through the portal at least five working days "
+    "in advance and approved by the line manager before the change takes effect."
+)
+# Answers the API gives when the LLM call failed or nothing was found; a benchmark request that gets one failed
+FAILED_ANSWERS = ("Unable to connect with model.", "I'm sorry, I couldn't find an exact answer in my knowledge base.")
+
+
+def vocabulary(size=2000, seed=0):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_document(i, words, length=300):
+    """(filename, text) for document i: one topic, a unique reference and filler from the vocabulary."""
+    rng = random.Random(i)
+    topic = TOPICS[i % len(TOPICS)]
+    sentences = [f"This {topic} policy, reference {topic}-{i}, applies to all staff."]
+    count = len(sentences[0].split())
+    while count < length:
+        sentence = rng.sample(words, rng.randint(8, 16))
+        sentence.insert(rng.randrange(len(sentence)), topic)
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        count += len(sentence)
+    return f"{topic}_{i:06d}.pdf", " ".join(sentences)
+
+
+def render_pdf(text, words_per_page=350):
+    import fitz
+
+    doc = fitz.open()
+    tokens = text.split()
+    for start in range(0, len(tokens), words_per_page):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 790), " ".join(tokens[start:start + words_per_page]), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def synthetic_question(i, words):
+    rng = random.Random(10_000_000 + i)
+    # The numeric suffix keeps every question out of the answer and retrieval caches
+    return f"What does the {rng.choice(TOPICS)} policy say about {rng.choice(words)}? ({i})"
+
+
+# ---- Server side (child process) ----
+
+class StubCompletions:
+    """Stands in for groq.AsyncGroq().chat.completions with fixed latency and a canned answer."""
+
+    def __init__(self, ttft, token_latency):
+        self.ttft = ttft
+        self.token_latency = token_latency
+        self.pieces = [word + " " for word in CANNED_ANSWER.split(" ")]
+
+    async def create(self, messages, max_tokens=None, stream=False, **kwargs):
+        pieces = self.pieces[:max_tokens] if max_tokens else self.pieces
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(pieces),
+                                total_tokens=prompt_tokens + len(pieces))
+        if stream:
+            return self._stream(pieces, usage)
+        await asyncio.sleep(self.ttft + self.token_latency * len(pieces))
+        message = SimpleNamespace(content="".join(pieces))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    async def _stream(self, pieces, usage):
+        await asyncio.sleep(self.ttft)
+        for piece in pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], x_groq=None)
+            await asyncio.sleep(self.token_latency)
+        yield SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage))
+
+
+class HashModel:
+    def encode(self, texts, batch_size=32, normalize_embeddings=False):
+        single = isinstance(texts, str)
+        vectors = np.zeros((1 if single else len(texts), 384), dtype=np.float32)
+        for row, text in enumerate([texts] if single else texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % 384] += 1.0
+        vectors[:, 0] += 1e-3  # never all-zero
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+
+def serve(port, args):
+    import uvicorn
+    import main as backend
+    from embeddings import LazyEmbedder
+
+    backend.groq_client = SimpleNamespace(chat=SimpleNamespace(
+        completions=StubCompletions(args.llm_ttft_ms / 1000, args.llm_token_ms / 1000)
+    ))
+    if args.stub_embedder:
+        class HashEmbedder(LazyEmbedder):
+            def get(self):
+                if self.model is None:
+                    self.model, self.load_seconds = HashModel(), 0.0
+                return self.model
+
+        backend.model = HashEmbedder(backend="hash")
+    uvicorn.run(backend.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# ---- Client side ----
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_memory_mb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                fields[name] = round(int(value.split()[0]) / 1024, 1)
+    return {"rss_mb": fields.get("VmRSS"), "peak_rss_mb": fields.get("VmHWM")}
+
+
+def parse_metrics(text):
+    """{(name, ((label, value), ...)): value} from Prometheus text format."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, labels = series.partition("{")
+        pairs = tuple(tuple(pair.split("=", 1)) for pair in labels.rstrip("}").split(",") if pair)
+        samples[(name, tuple((k, v.strip('"')) for k, v in pairs))] = float(value)
+    return samples
+
+
+def metric(samples, name, **labels):
+    """Sum of the samples of `name` whose labels include `labels`."""
+    return sum(
+        value for (n, pairs), value in samples.items()
+        if n == name and all(dict(pairs).get(k) == v for k, v in labels.items())
+    )
+
+
+def stage_means(samples):
+    means = {}
+    for (name, labels), total in samples.items():
+        if name != "rag_stage_seconds_sum":
+            continue
+        count = samples.get(("rag_stage_seconds_count", labels), 0)
+        if count:
+            key = "{pipeline}.{stage}".format(**dict(labels))
+            means[key] = round(total / count * 1000, 3)
+    return dict(sorted(means.items()))
+
+
+def check_answer(result):
+    if "error" in result or result.get("answer") in FAILED_ANSWERS:
+        raise ValueError(result.get("error") or result.get("answer"))
+
+
+def summarize(latencies, errors, elapsed):
+    ms = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "seconds": round(elapsed, 3),
+    }
+
+
+async def drive(concurrency, total, request):
+    """Run request(i) for i in range(total) over `concurrency` workers; latency summary."""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await request(i)
+            except (httpx.HTTPError, ValueError, KeyError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def wait_ready(client, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server exited with code {proc.returncode}")
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("Server did not become ready in time")
+
+
+async def wait_drained(client, expected, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        samples = parse_metrics((await client.get("/metrics")).text)
+        finished = metric(samples, "rag_ingest_jobs", status="done") + metric(samples, "rag_ingest_jobs", status="failed")
+        if finished >= expected:
+            return samples
+        await asyncio.sleep(0.5)
+    raise SystemExit("Ingestion queue did not drain in time")
+
+
+async def run_corpus(docs, args, words):
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "GROQ_API_KEY": env.get("GROQ_API_KEY", "bench"),
+        # SQLite takes one writer at a time
+        "INGEST_WORKERS": env.get("INGEST_WORKERS", "1"),
+    })
+    command = [sys.executable, os.path.abspath(__file__), "--serve", str(port),
+               "--llm-ttft-ms", str(args.llm_ttft_ms), "--llm-token-ms", str(args.llm_token_ms)]
+    if args.stub_embedder:
+        command.append("--stub-embedder")
+    log = open(os.path.join(workdir, "server.log"), "w")
+    proc = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    run = {"docs": docs}
+    try:
+        limits = httpx.Limits(max_connections=max(args.upload_concurrency, *args.concurrency))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout,
+                                     limits=limits) as client:
+            await wait_ready(client, proc, args.timeout)
+            run["memory_idle"] = process_memory_mb(proc.pid)
+
+            async def upload(i):
+                filename, text = synthetic_document(i, words, args.doc_words)
+                r = await client.post("/upload/", files={"file": (filename, render_pdf(text), "application/pdf")})
+                r.raise_for_status()
+                if "error" in r.json():
+                    raise ValueError(r.json()["error"])
+
+            start = time.perf_counter()
+            run["upload"] = await drive(args.upload_concurrency, docs, upload)
+            samples = await wait_drained(client, run["upload"]["ok"], args.drain_timeout)
+            elapsed = time.perf_counter() - start
+            run["ingest"] = {
+                "indexed": int(metric(samples, "rag_ingested_documents_total", outcome="indexed")),
+                "failed": int(metric(samples, "rag_ingest_jobs", status="failed")),
+                "seconds": round(elapsed, 3),
+                "docs_per_sec": round(docs / elapsed, 2) if elapsed > 0 else None,
+            }
+            run["memory_after_upload"] = process_memory_mb(proc.pid)
+
+            # A bare reference code is found by BM25 alone; it must get past the relevance gate to the LLM
+            r = await client.post("/query/", json={"question": f"{TOPICS[0]}-0", "top_k": args.top_k})
+            run["checks"] = {"exact_code_answered": r.status_code == 200 and bool(r.json().get("sources"))}
+
+            offset = 0
+
+            async def query(i):
+                payload = {"question": synthetic_question(offset + i, words), "top_k": args.top_k}
+                if args.stream:
+                    async with client.stream("POST", "/query/stream", json=payload) as r:
+                        r.raise_for_status()
+                        event = None
+                        async for line in r.aiter_lines():
+                            if line.startswith("event: "):
+                                event = line[len("event: "):]
+                                if event == "error":
+                                    raise ValueError("stream error")
+                            elif line.startswith("data: ") and event == "done":
+                                check_answer(json.loads(line[len("data: "):]))
+                                return
+                        raise ValueError("stream ended without a done event")
+                else:
+                    r = await client.post("/query/", json=payload)
+                    r.raise_for_status()
+                    check_answer(r.json())
+
+            run["query"] = []
+            for level in args.concurrency:
+                result = await drive(level, args.queries, query)
+                run["query"].append({"concurrency": level, **result})
+                offset += args.queries  # fresh questions for every level
+            run["memory_after_query"] = process_memory_mb(proc.pid)
+
+            samples = parse_metrics((await client.get("/metrics")).text)
+            run["index"] = {
+                "vectors": int(metric(samples, "rag_index_vectors")),
+                "lexical_entries": int(metric(samples, "rag_lexical_entries")),
+            }
+            run["stage_ms"] = stage_means(samples)
+    finally:
+        # SIGINT lets uvicorn run the shutdown hook, which snapshots the index
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=120)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+        if "index" in run:
+            run["index"]["faiss_bytes"] = sum(
+                os.path.getsize(os.path.join(workdir, name))
+                for name in os.listdir(workdir) if name.startswith("faiss_index.bin")
+            )
+            run["index"]["database_bytes"] = os.path.getsize(os.path.join(workdir, "bench.db"))
+        elif os.path.exists(log.name):
+            with open(log.name) as f:
+                print(f.read()[-2000:])
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return run
+
+
+def git_commit():
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_run(run):
+    upload, ingest = run["upload"], run["ingest"]
+    print(f"\n{run['docs']} documents, {run['index']['vectors']} vectors, "
+          f"FAISS {run['index']['faiss_bytes'] / 2**20:.1f} MB, DB {run['index']['database_bytes'] / 2**20:.1f} MB, "
+          f"RSS {run['memory_after_query']['rss_mb']} MB (peak {run['memory_after_query']['peak_rss_mb']} MB)")
+    print(f"upload   p50 {upload['p50_ms']:.1f} ms  p95 {upload['p95_ms']:.1f}  p99 {upload['p99_ms']:.1f}  "
+          f"errors {upload['errors']}  ingest {ingest['docs_per_sec']} docs/s")
+    failed = [name for name, ok in run.get("checks", {}).items() if not ok]
+    if failed:
+        print(f"FAILED checks: {', '.join(failed)}")
+    print(f"{'clients':>8} {'ok':>6} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for r in run["query"]:
+        print(f"{r['concurrency']:>8} {r['ok']:>6} {r['errors']:>7} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['per_sec']:>8.1f}")
+
+
+def compare(report, baseline):
+    """Print relative change against an earlier report, matching runs by corpus size and concurrency."""
+    print(f"\nvs {baseline.get('commit')}:")
+    old_runs = {run["docs"]: run for run in baseline.get("runs", [])}
+    for run in report["runs"]:
+        old = old_runs.get(run["docs"])
+        if old is None:
+            continue
+        rows = [
+            ("ingest docs/s", run["ingest"]["docs_per_sec"], old["ingest"]["docs_per_sec"]),
+            ("upload p95 ms", run["upload"]["p95_ms"], old["upload"]["p95_ms"]),
+            ("rss MB", run["memory_after_query"]["rss_mb"], old["memory_after_query"]["rss_mb"]),
+            ("faiss bytes", run["index"]["faiss_bytes"], old["index"]["faiss_bytes"]),
+        ]
+        old_levels = {r["concurrency"]: r for r in old["query"]}
+        for r in run["query"]:
+            if r["concurrency"] in old_levels:
+                o = old_levels[r["concurrency"]]
+                rows.append((f"query c={r['concurrency']} p99 ms", r["p99_ms"], o["p99_ms"]))
+                rows.append((f"query c={r['concurrency']} req/s", r["per_sec"], o["per_sec"]))
+        print(f"  {run['docs']} documents")
+        for name, new, before in rows:
+            change = f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"    {name:<24} {before!s:>12} -> {new!s:>12}  {change}")
+
+
+async def main(args):
+    words = vocabulary()
+    report = {
+        "commit": git_commit(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare", "serve", "keep")},
+        "runs": [],
+    }
+    for docs in args.docs:
+        run = await run_corpus(docs, args, words)
+        report["runs"].append(run)
+        print_run(run)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark uploads and queries against a stubbed, self-contained API")
+    parser.add_argument("--docs", type=int, nargs="+", default=[1000], help="corpus sizes, e.g. 1000 10000 100000")
+    parser.add_argument("--doc-words", type=int, default=300)
+    parser.add_argument("--upload-concurrency", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="query concurrency levels")
+    parser.add_argument("--queries", type=int, default=200, help="queries per concurrency level")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="query /query/stream instead of /query/")
+    parser.add_argument("--llm-ttft-ms", type=float, default=200, help="stub LLM time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=10, help="stub LLM time per token")
+    parser.add_argument("--stub-embedder", action="store_true", help="hashing embedder instead of the model")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--drain-timeout", type=float, default=3600)
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    parser.add_argument("--compare", default=None, help="earlier report to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the server's working directory")
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args)
+    else:
+        asyncio.run(main(args))
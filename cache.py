@@ -0,0 +1,152 @@
+import hashlib
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from os import getenv
+from typing import Any, Dict, Optional
+
+# Cache configuration
+EMBEDDING_CACHE_SIZE = int(getenv("EMBEDDING_CACHE_SIZE", "4096"))
+RETRIEVAL_CACHE_SIZE = int(getenv("RETRIEVAL_CACHE_SIZE", "4096"))
+ANSWER_CACHE_SIZE = int(getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(getenv("ANSWER_CACHE_TTL", "3600"))
+CACHE_BACKEND = getenv("CACHE_BACKEND", "local")  # local | redis
+REDIS_URL = getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    return _WHITESPACE.sub(" ", question).strip().lower().rstrip("?.! ")
+
+
+def digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else repr(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU with optional TTL and hit/miss counters.
+
+    clear() bumps `generation`. A caller that reads `generation` before
+    computing a value passes it to set(), so a value computed from data
+    that changed in the meantime is dropped instead of cached.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires, generation = item
+                if generation == self.generation and (expires is None or expires > time.monotonic()):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, generation: Optional[int] = None):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (value, expires, self.generation)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {
+            "backend": "local",
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+class RedisCache:
+    """
+    Shared cache for several API workers, same interface as LRUCache.
+    clear() bumps a generation number instead of scanning keys, so stale
+    entries are simply never read again and expire through their TTL.
+    """
+
+    def __init__(self, name: str, url: str, ttl: Optional[float] = None):
+        import redis  # optional dependency, only needed with CACHE_BACKEND=redis
+
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = redis.Redis.from_url(url)
+        self._generation_key = f"rag:{name}:generation"
+
+    @property
+    def generation(self) -> int:
+        return int(self._client.get(self._generation_key) or 0)
+
+    def _key(self, key, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return f"rag:{self.name}:{generation}:{digest(key)}"
+
+    def get(self, key) -> Any:
+        raw = self._client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, generation: Optional[int] = None):
+        # Written under the caller's generation: if it is stale, nobody reads it again
+        ttl = int(self.ttl) if self.ttl else None
+        self._client.set(self._key(key, generation), pickle.dumps(value), ex=ttl)
+
+    def clear(self):
+        self._client.incr(self._generation_key)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+def make_shared_cache(name: str, maxsize: int, ttl: Optional[float] = None):
+    """Shared backend when configured, otherwise the in-process LRU stand-in."""
+    if CACHE_BACKEND == "redis":
+        try:
+            return RedisCache(name, REDIS_URL, ttl=ttl)
+        except ImportError:
+            print("CACHE_BACKEND=redis but the redis package is not installed; using local cache")
+    return LRUCache(name, maxsize, ttl=ttl)
@@ -0,0 +1,124 @@
+"""
+Pick MIN_VECTOR_SCORE / MIN_LEXICAL_SCORE from a labelled question set.
+
+    python calibrate_thresholds.py questions.jsonl --min-recall 0.95
+
+One JSON object per line: {"question": "...", "answerable": true} and
+optionally "collections": ["hr"]. Each question runs through retrieval only
+(no LLM). The tool picks the thresholds that gate the most unanswerable
+questions while still passing at least --min-recall of the answerable ones,
+and reports how many LLM calls they would have saved.
+"""
+import argparse
+import asyncio
+import json
+import math
+
+import numpy as np
+
+from relevance import MAX_SCORE_GAP, MIN_LEXICAL_SCORE, MIN_VECTOR_SCORE, best_scores, select_hits
+
+OFF = float("inf")  # a threshold nothing reaches, i.e. that retriever never passes a hit
+
+
+def load_questions(path):
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        if "question" not in row or "answerable" not in row:
+            raise SystemExit(f"Each line needs 'question' and 'answerable': {row}")
+    return rows
+
+
+async def retrieve_all(backend, rows, k):
+    from cache import normalize_question
+    results = []
+    for row in rows:
+        question = row["question"]
+        hits = await backend.hybrid_search(question, normalize_question(question), k,
+                                           collections=row.get("collections"))
+        results.append(hits)
+    return results
+
+
+def candidate_thresholds(values, grid):
+    values = np.array([v for v in values if v is not None], dtype=np.float64)
+    if not len(values):
+        return [OFF]
+    points = np.unique(np.quantile(values, np.linspace(0, 1, grid)))
+    # A setting of 0 means "disabled", so it can't be used as a threshold; ties prefer a real one over OFF
+    return [float(p) for p in points if p > 0] + [OFF]
+
+
+def evaluate(vector, lexical, answerable, min_vector, min_lexical):
+    """(recall of answerable questions, fraction of unanswerable ones gated) for one threshold pair."""
+    passes = (vector >= min_vector) | (lexical >= min_lexical)
+    recall = passes[answerable].mean() if answerable.any() else 1.0
+    gated = (~passes[~answerable]).mean() if (~answerable).any() else 0.0
+    return float(recall), float(gated), passes
+
+
+def as_setting(threshold):
+    # Round down, so the question that set the threshold still passes it
+    return 0.0 if threshold == OFF else math.floor(threshold * 10000) / 10000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate relevance thresholds from labelled questions")
+    parser.add_argument("questions", help="JSONL file of {question, answerable[, collections]}")
+    parser.add_argument("--min-recall", type=float, default=0.95,
+                        help="fraction of answerable questions that must still reach the LLM")
+    parser.add_argument("--k", type=int, default=None, help="top_k used for retrieval (default TOP_K)")
+    parser.add_argument("--grid", type=int, default=50, help="threshold candidates tried per retriever")
+    args = parser.parse_args()
+
+    import main as backend
+    backend.initialize()
+
+    rows = load_questions(args.questions)
+    k = args.k or backend.TOP_K
+    all_hits = asyncio.run(retrieve_all(backend, rows, k))
+    best = [best_scores(hits) for hits in all_hits]
+    # A question with no score from a retriever can't pass through it
+    vector = np.array([b["vector_score"] if b["vector_score"] is not None else -np.inf for b in best])
+    lexical = np.array([b["lexical_score"] if b["lexical_score"] is not None else -np.inf for b in best])
+    answerable = np.array([bool(row["answerable"]) for row in rows])
+    print(f"{len(rows)} questions: {int(answerable.sum())} answerable, {int((~answerable).sum())} unanswerable")
+
+    chosen = None
+    for min_vector in candidate_thresholds(vector[np.isfinite(vector)], args.grid):
+        for min_lexical in candidate_thresholds(lexical[np.isfinite(lexical)], args.grid):
+            if min_vector == OFF and min_lexical == OFF:
+                continue
+            recall, gated, passes = evaluate(vector, lexical, answerable, min_vector, min_lexical)
+            if recall < args.min_recall:
+                continue
+            if chosen is None or (gated, recall) > (chosen[2], chosen[1]):
+                chosen = (min_vector, min_lexical, gated, recall, passes)
+
+    if MIN_VECTOR_SCORE or MIN_LEXICAL_SCORE:
+        current = evaluate(vector, lexical, answerable, MIN_VECTOR_SCORE or OFF, MIN_LEXICAL_SCORE or OFF)
+    else:
+        # Both thresholds off: everything reaches the LLM
+        current = evaluate(vector, lexical, answerable, -np.inf, -np.inf)
+    print(f"{'setting':<12} {'MIN_VECTOR':>10} {'MIN_LEXICAL':>11} {'recall':>7} {'gated':>7} {'calls saved':>12}")
+    print(f"{'current':<12} {MIN_VECTOR_SCORE:>10.4f} {MIN_LEXICAL_SCORE:>11.4f} {current[0]:>7.3f} {current[1]:>7.3f} "
+          f"{int((~current[2]).sum()):>12}")
+    if chosen is None:
+        print(f"No thresholds keep recall >= {args.min_recall}; lower --min-recall or check the labels")
+        return
+    min_vector, min_lexical, gated, recall, passes = chosen
+    print(f"{'calibrated':<12} {as_setting(min_vector):>10.4f} {as_setting(min_lexical):>11.4f} {recall:>7.3f} "
+          f"{gated:>7.3f} {int((~passes).sum()):>12}")
+
+    # Adaptive k: passages the LLM would still see for questions that pass
+    kept = [len(select_hits(hits, as_setting(min_vector), as_setting(min_lexical), MAX_SCORE_GAP))
+            for hits, ok in zip(all_hits, passes) if ok]
+    if kept:
+        print(f"Passages per answered query with MAX_SCORE_GAP={MAX_SCORE_GAP}: "
+              f"{np.mean(kept):.2f} on average (top_k {k})")
+    print(f"\nMIN_VECTOR_SCORE={as_setting(min_vector)}\nMIN_LEXICAL_SCORE={as_setting(min_lexical)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import re
+from os import getenv
+from typing import Iterable, Iterator, List, Tuple
+
+# Chunking configuration (characters)
+CHUNK_SIZE = int(getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(getenv("CHUNK_OVERLAP", "150"))
+
+# Sentence boundary: end punctuation followed by whitespace, or a blank line
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def split_sentences(text: str) -> List[Tuple[int, str]]:
+    """Split text into (offset, sentence) pairs, offsets into the original text."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        if match.start() > start:
+            sentences.append((start, text[start:match.start()]))
+        start = match.end()
+    if start < len(text):
+        sentences.append((start, text[start:]))
+    return [(offset, s) for offset, s in sentences if s.strip()]
+
+
+def _hard_split(offset: int, sentence: str, chunk_size: int, overlap: int):
+    # A single sentence longer than a chunk is cut on whitespace near the limit
+    step = max(chunk_size - overlap, 1)
+    pos = 0
+    while pos < len(sentence):
+        end = min(pos + chunk_size, len(sentence))
+        if end < len(sentence):
+            space = sentence.rfind(" ", pos + step // 2, end)
+            if space > pos:
+                end = space
+        yield offset + pos, sentence[pos:end]
+        if end >= len(sentence):
+            break
+        pos = max(end - overlap, pos + 1)
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, str]]:
+    """
+    Sentence-aware chunking. Sentences are packed into chunks of at most
+    `chunk_size` characters; each chunk starts with the trailing sentences of
+    the previous one, up to `overlap` characters. Returns (offset, text) pairs.
+    """
+    if not text or not text.strip():
+        return []
+    overlap = max(0, min(overlap, chunk_size // 2))
+
+    pieces = []
+    for offset, sentence in split_sentences(text):
+        if len(sentence) > chunk_size:
+            pieces.extend(_hard_split(offset, sentence, chunk_size, overlap))
+        else:
+            pieces.append((offset, sentence))
+
+    chunks = []
+    current = []  # (offset, sentence) pairs of the chunk being built
+    for offset, sentence in pieces:
+        end = offset + len(sentence)
+        if current and end - current[0][0] > chunk_size:
+            chunks.append(current)
+            # Carry trailing sentences over as overlap
+            carried = []
+            size = 0
+            for prev in reversed(current):
+                size += len(prev[1])
+                if size > overlap:
+                    break
+                carried.insert(0, prev)
+            current = carried
+            # Drop carried sentences that no longer leave room for this one
+            while current and end - current[0][0] > chunk_size:
+                current.pop(0)
+        current.append((offset, sentence))
+    if current:
+        chunks.append(current)
+
+    result = []
+    for group in chunks:
+        start = group[0][0]
+        end = group[-1][0] + len(group[-1][1])
+        result.append((start, text[start:end].strip()))
+    return result
+
+
+def chunk_stream(segments: Iterable[str], chunk_size: int = CHUNK_SIZE,
+                 overlap: int = CHUNK_OVERLAP) -> Iterator[Tuple[int, str]]:
+    """
+    chunk_text over a stream of text segments (pages, paragraph groups),
+    yielding chunks as soon as they are complete. Offsets are into the
+    segments joined with newlines; only the last, still-open chunk is kept
+    between segments, so memory stays bounded by one segment plus a chunk.
+    """
+    buffer = ""
+    base = 0
+    for segment in segments:
+        buffer += segment + "\n"
+        chunks = chunk_text(buffer, chunk_size, overlap)
+        if len(chunks) < 2:
+            continue
+        for offset, text in chunks[:-1]:
+            yield base + offset, text
+        # Re-pack from the start of the open chunk once more text arrives
+        cut = chunks[-1][0]
+        buffer = buffer[cut:]
+        base += cut
+    for offset, text in chunk_text(buffer, chunk_size, overlap):
+        yield base + offset, text
@@ -0,0 +1,70 @@
+import hashlib
+import sqlite3
+import threading
+import zlib
+from os import getenv
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# On-disk cache of extracted text (by file hash) and embeddings (by chunk hash)
+CONTENT_CACHE_PATH = getenv("CONTENT_CACHE_PATH", "content_cache.sqlite")
+
+
+def sha256_hex(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class ContentCache:
+    """
+    SQLite-backed cache that lets re-ingestion and index rebuilds skip
+    PyMuPDF (extracted text keyed by the SHA-256 of the raw file) and the
+    embedding model (vectors keyed by the SHA-256 of chunk text and model).
+    """
+
+    def __init__(self, path: str = CONTENT_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS texts (hash TEXT PRIMARY KEY, body BLOB NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.conn.commit()
+
+    def get_text(self, file_hash: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT body FROM texts WHERE hash = ?", (file_hash,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def put_text(self, file_hash: str, text: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO texts (hash, body) VALUES (?, ?)",
+                (file_hash, zlib.compress(text.encode("utf-8"))),
+            )
+            self.conn.commit()
+
+    def get_embeddings(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with self.lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE hash IN ({placeholders})", batch
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_embeddings(self, vectors: Dict[str, np.ndarray]):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, vector) VALUES (?, ?)",
+                [(h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in vectors.items()],
+            )
+            self.conn.commit()
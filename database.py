@@ -0,0 +1,106 @@
+import threading
+from contextlib import contextmanager
+from os import getenv
+from typing import Dict, List
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+# Connection pool: kept connections, extra ones under load, and how long to wait for one.
+# Size it to BLOCKING_WORKERS plus the ingestion workers so threads never queue for a connection.
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle before MySQL's wait_timeout closes idle connections server-side
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", "1800"))
+# Rows per INSERT statement in bulk_insert()
+DB_BULK_BATCH = int(getenv("DB_BULK_BATCH", "1000"))
+# Run query-path reads on an async driver (aiomysql) instead of a pool thread
+DB_ASYNC = getenv("DB_ASYNC", "0") == "1"
+ASYNC_DRIVERS = {"mysql+pymysql": "mysql+aiomysql", "mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+
+def make_engine(url: str):
+    if url.startswith("sqlite"):
+        # SQLite connections are cheap and file-local; pool sizing doesn't apply
+        return create_engine(url)
+    return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+                         pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+
+
+def make_session_factory(engine) -> sessionmaker:
+    # expire_on_commit=False: projected rows and ids stay readable after the session closes
+    return sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+@contextmanager
+def session_scope(factory: sessionmaker):
+    """A session that commits on success, rolls back on error and always goes back to the pool."""
+    db: Session = factory()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def bulk_insert(db: Session, model, rows: List[Dict], batch: int = DB_BULK_BATCH):
+    """
+    Multi-row INSERTs through Core, skipping the ORM's per-object bookkeeping
+    (and MySQL's one-statement-per-row to fetch generated keys). Use for rows
+    whose ids nobody needs back, e.g. chunks.
+    """
+    for start in range(0, len(rows), batch):
+        db.execute(insert(model.__table__), rows[start:start + batch])
+
+
+def async_url(url: str) -> str:
+    driver, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(driver, driver) + sep + rest
+
+
+class AsyncDatabase:
+    """
+    Optional async engine over the same database, created on first use.
+    If the driver isn't installed, `available` turns False and callers fall
+    back to the sync engine in a thread.
+    """
+
+    def __init__(self, url: str, enabled: bool = DB_ASYNC):
+        self.url = getenv("ASYNC_DATABASE_URL") or async_url(url)
+        self.enabled = enabled
+        self.engine = None
+        self.failed = False
+        self.lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and not self.failed and self._engine() is not None
+
+    def _engine(self):
+        if self.engine is None and not self.failed:
+            with self.lock:
+                if self.engine is None and not self.failed:
+                    try:
+                        from sqlalchemy.ext.asyncio import create_async_engine
+                        kwargs = {} if self.url.startswith("sqlite") else dict(
+                            pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+                            pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+                        self.engine = create_async_engine(self.url, **kwargs)
+                    except ImportError as e:
+                        print(f"Async database driver unavailable ({e}), using the sync engine")
+                        self.failed = True
+        return self.engine
+
+    async def fetch_all(self, statement) -> List:
+        async with self._engine().connect() as conn:
+            result = await conn.execute(statement)
+            return result.all()
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+from os import getenv
+from typing import List, Optional
+
+import fitz  # PyMuPDF, for page rendering
+
+# Original uploads, stored by content hash so duplicate uploads share one file
+DOCUMENT_STORE_DIR = getenv("DOCUMENT_STORE_DIR", "uploaded_docs")
+# Rendered page PNGs and page offset tables, one directory per content hash
+THUMBNAIL_DIR = getenv("THUMBNAIL_DIR", "thumbnails")
+THUMBNAIL_WIDTH = int(getenv("THUMBNAIL_WIDTH", "800"))
+MAX_THUMBNAIL_WIDTH = 2000
+
+
+def stored_path(file_hash: str) -> str:
+    return os.path.join(DOCUMENT_STORE_DIR, file_hash)
+
+
+def is_stored(file_hash: Optional[str]) -> bool:
+    return bool(file_hash) and os.path.exists(stored_path(file_hash))
+
+
+def store_file(path: str, file_hash: str) -> str:
+    """Move a spooled upload into the store; if those bytes are already stored, just drop it."""
+    target = stored_path(file_hash)
+    if os.path.exists(target):
+        os.remove(path)
+        return target
+    os.makedirs(DOCUMENT_STORE_DIR, exist_ok=True)
+    shutil.move(path, target)
+    return target
+
+
+def store_bytes(data: bytes, file_hash: str) -> str:
+    target = stored_path(file_hash)
+    if os.path.exists(target):
+        return target
+    os.makedirs(DOCUMENT_STORE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(delete=False, dir=DOCUMENT_STORE_DIR) as tmp:
+        tmp.write(data)
+    os.replace(tmp.name, target)
+    return target
+
+
+def remove_stored(file_hash: str):
+    """Drop the stored original and everything rendered from it."""
+    if os.path.exists(stored_path(file_hash)):
+        os.remove(stored_path(file_hash))
+    shutil.rmtree(os.path.join(THUMBNAIL_DIR, file_hash), ignore_errors=True)
+
+
+def _cache_path(file_hash: str, name: str) -> str:
+    directory = os.path.join(THUMBNAIL_DIR, file_hash)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def save_page_starts(file_hash: str, starts: List[int]):
+    """Character offset at which each page starts in the extracted text (pages joined by newlines)."""
+    path = _cache_path(file_hash, "pages.json")
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(starts, f)
+
+    _write_atomic(path, write)
+
+
+def page_starts(file_hash: str) -> List[int]:
+    path = _cache_path(file_hash, "pages.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    # Documents ingested from cached text: derive the table from the PDF once
+    starts, position = [], 0
+    with fitz.open(stored_path(file_hash), filetype="pdf") as doc:
+        for page in doc:
+            starts.append(position)
+            position += len(page.get_text("text")) + 1
+    save_page_starts(file_hash, starts)
+    return starts
+
+
+def render_page(file_hash: str, page: int, width: int = THUMBNAIL_WIDTH) -> str:
+    """PNG of a 1-based page scaled to `width` pixels, rendered once and cached on disk."""
+    path = _cache_path(file_hash, f"p{page}_w{width}.png")
+    if os.path.exists(path):
+        return path
+    with fitz.open(stored_path(file_hash), filetype="pdf") as doc:
+        if not 1 <= page <= doc.page_count:
+            raise IndexError(f"Page {page} out of range (1-{doc.page_count})")
+        pdf_page = doc[page - 1]
+        zoom = width / pdf_page.rect.width
+        pixmap = pdf_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        _write_atomic(path, lambda tmp: pixmap.save(tmp, output="png"))
+    return path
+
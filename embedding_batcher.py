@@ -0,0 +1,62 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+from typing import Callable, List
+
+import numpy as np
+
+# Micro-batching of concurrent query embeddings
+EMBED_MAX_BATCH = int(getenv("EMBED_MAX_BATCH", "32"))
+EMBED_MAX_WAIT_MS = float(getenv("EMBED_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests for up to `max_wait_ms` (or `max_batch`
+    texts) and encodes them with one model call on a dedicated thread, so
+    concurrent queries share a forward pass and never block the event loop.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray],
+                 max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        # One encode at a time: the model already uses every core per call
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._queue = None
+        self._worker = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
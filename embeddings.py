@@ -0,0 +1,71 @@
+import threading
+import time
+from os import getenv
+from typing import List, Optional, Union
+
+import numpy as np
+
+# Embedding model and runtime. All backends produce vectors for the same
+# model, so an index built with one can be queried with another.
+EMBEDDING_MODEL_NAME = getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = getenv("EMBEDDING_BACKEND", "torch")  # torch | onnx | int8
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+EMBEDDING_DIM = 384
+
+
+def load_model(name: str = EMBEDDING_MODEL_NAME, backend: str = EMBEDDING_BACKEND):
+    """
+    torch: the stock SentenceTransformer.
+    onnx:  the same weights on ONNX Runtime (needs `sentence-transformers[onnx]`).
+    int8:  torch with Linear layers dynamically quantised to int8, no extra dependencies.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+    # Imported here: pulling in torch is most of the cold-start cost
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(name, backend="onnx")
+        except Exception as e:
+            print(f"ONNX embedding backend unavailable ({e}); using torch")
+            return SentenceTransformer(name)
+    model = SentenceTransformer(name)
+    if backend == "int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+class LazyEmbedder:
+    """Loads the embedding model on first use (or on warm_up) instead of at import time."""
+
+    def __init__(self, name: str = EMBEDDING_MODEL_NAME, backend: str = EMBEDDING_BACKEND):
+        self.name = name
+        self.backend = backend
+        self.model = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def get(self):
+        if self.model is None:
+            with self._lock:
+                if self.model is None:
+                    start = time.perf_counter()
+                    model = load_model(self.name, self.backend)
+                    self.load_seconds = time.perf_counter() - start
+                    print(f"Loaded embedding model {self.name} ({self.backend}) in {self.load_seconds:.2f}s")
+                    self.model = model
+        return self.model
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False) -> np.ndarray:
+        return self.get().encode(texts, batch_size=batch_size, normalize_embeddings=normalize_embeddings)
+
+    def warm_up(self, sample: Optional[str] = None):
+        """Load the model and run one encode, so the first real query doesn't pay for either."""
+        self.encode([sample or "warm-up query"], normalize_embeddings=True)
@@ -0,0 +1,160 @@
+import hashlib
+import io
+import multiprocessing
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import getenv
+import os
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF for PDF
+import docx
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+EXTRACT_WORKERS = int(getenv("EXTRACT_WORKERS", str(os.cpu_count() or 4)))
+# Streaming extraction: pages per worker task, paragraphs per DOCX segment, upload spool location
+PDF_PAGES_PER_TASK = int(getenv("PDF_PAGES_PER_TASK", "16"))
+DOCX_PARAGRAPHS_PER_SEGMENT = int(getenv("DOCX_PARAGRAPHS_PER_SEGMENT", "200"))
+UPLOAD_SPOOL_DIR = getenv("UPLOAD_SPOOL_DIR") or None
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+
+def file_extension(filename: str) -> str:
+    """Lower-cased extension, so REPORT.PDF and report.pdf are handled alike everywhere."""
+    return os.path.splitext(filename)[1].lower()
+
+
+def is_supported(filename: str) -> bool:
+    return file_extension(filename) in SUPPORTED_EXTENSIONS
+
+
+def extract_text_from_pdf(pdf_file):
+    doc = fitz.open(stream=pdf_file, filetype="pdf")
+    return "\n".join(page.get_text("text") for page in doc).strip()
+
+
+def extract_text_from_docx(docx_file):
+    doc = docx.Document(docx_file)
+    return "\n".join(para.text for para in doc.paragraphs).strip()
+
+
+def extract_text(filename: str, data: bytes) -> str:
+    if file_extension(filename) == ".pdf":
+        return extract_text_from_pdf(data)
+    if file_extension(filename) == ".docx":
+        return extract_text_from_docx(io.BytesIO(data))
+    raise ValueError("Unsupported file format")
+
+
+def _extract_safe(item: Tuple[str, bytes]) -> Tuple[str, str, str]:
+    filename, data = item
+    try:
+        return filename, extract_text(filename, data), None
+    except Exception as e:
+        return filename, "", str(e) or type(e).__name__
+
+
+_pool = None
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn keeps worker processes free of the parent's model and index state
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def extract_many(items: List[Tuple[str, bytes]], workers: int = EXTRACT_WORKERS) -> List[Tuple[str, str, str]]:
+    """
+    Extract text from (filename, bytes) pairs across a process pool.
+    Returns (filename, text, error) triples in input order.
+    """
+    if workers <= 1 or len(items) <= 1:
+        return [_extract_safe(item) for item in items]
+    return list(_get_pool(workers).map(_extract_safe, items))
+
+
+def spool_to_disk(source: BinaryIO, suffix: str = "", directory: Optional[str] = UPLOAD_SPOOL_DIR) -> Tuple[str, str]:
+    """
+    Copy an upload to a temporary file block by block, hashing as it goes.
+    Returns (path, sha256 hex); the caller removes the file.
+    """
+    digest = hashlib.sha256()
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    spool = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory)
+    try:
+        with spool:
+            while True:
+                block = source.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                spool.write(block)
+    except Exception:
+        os.remove(spool.name)
+        raise
+    return spool.name, digest.hexdigest()
+
+
+def pdf_page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _extract_pdf_pages(task: Tuple[str, int, int]) -> List[str]:
+    path, start, stop = task
+    with fitz.open(path) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+
+def iter_pdf_pages(path: str, workers: int = EXTRACT_WORKERS,
+                   pages_per_task: int = PDF_PAGES_PER_TASK) -> Iterator[str]:
+    """
+    Yield page texts in order. Page ranges are extracted in parallel on the
+    process pool; at most `workers + 1` ranges are in flight, so memory does
+    not grow with the page count.
+    """
+    pages = pdf_page_count(path)
+    ranges = [(path, start, min(start + pages_per_task, pages)) for start in range(0, pages, pages_per_task)]
+    if workers <= 1 or len(ranges) <= 1:
+        for task in ranges:
+            yield from _extract_pdf_pages(task)
+        return
+    pool = _get_pool(workers)
+    pending = deque()
+    tasks = iter(ranges)
+    for task in tasks:
+        pending.append(pool.submit(_extract_pdf_pages, task))
+        if len(pending) > workers:
+            break
+    while pending:
+        yield from pending.popleft().result()
+        task = next(tasks, None)
+        if task is not None:
+            pending.append(pool.submit(_extract_pdf_pages, task))
+
+
+def segment_count(filename: str, path: str) -> Optional[int]:
+    """Number of segments iter_segments will yield, when known without parsing the whole file."""
+    if file_extension(filename) == ".pdf":
+        return pdf_page_count(path)
+    return None
+
+
+def iter_docx_paragraphs(path: str, per_segment: int = DOCX_PARAGRAPHS_PER_SEGMENT) -> Iterator[str]:
+    doc = docx.Document(path)
+    paragraphs = doc.paragraphs
+    for i in range(0, len(paragraphs), per_segment):
+        yield "\n".join(para.text for para in paragraphs[i:i + per_segment])
+
+
+def iter_segments(filename: str, path: str, workers: Optional[int] = None) -> Iterator[str]:
+    """Text of a spooled upload as a stream of page (PDF) or paragraph-group (DOCX) segments."""
+    if file_extension(filename) == ".pdf":
+        return iter_pdf_pages(path, workers=EXTRACT_WORKERS if workers is None else workers)
+    if file_extension(filename) == ".docx":
+        return iter_docx_paragraphs(path)
+    raise ValueError("Unsupported file format")
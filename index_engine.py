@@ -0,0 +1,171 @@
+from os import getenv
+from typing import Tuple
+
+import faiss
+import numpy as np
+
+# Index engine configuration
+# flat | ivf_flat | ivf_pq | hnsw, or compressed: flat_fp16 | flat_int8 | pq | ivf_fp16 | ivf_sq8
+INDEX_TYPE = getenv("FAISS_INDEX_TYPE", "flat")
+IVF_NLIST = int(getenv("FAISS_IVF_NLIST", "256"))
+IVF_NPROBE = int(getenv("FAISS_IVF_NPROBE", "16"))
+PQ_M = int(getenv("FAISS_PQ_M", "48"))  # sub-quantizers, must divide the dimension
+PQ_NBITS = int(getenv("FAISS_PQ_NBITS", "8"))
+HNSW_M = int(getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(getenv("FAISS_HNSW_EF_SEARCH", "64"))
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "flat_fp16", "flat_int8", "pq", "ivf_fp16", "ivf_sq8")
+# Kinds whose stored vectors are approximate (candidates for exact re-scoring)
+LOSSY_TYPES = ("ivf_pq", "flat_fp16", "flat_int8", "pq", "ivf_fp16", "ivf_sq8")
+# IVF inverted lists can be memory-mapped (faiss.IO_FLAG_MMAP); other kinds always load into RAM
+MMAP_TYPES = ("ivf_flat", "ivf_pq", "ivf_fp16", "ivf_sq8")
+
+SCALAR_QUANTIZERS = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def create_index(dim: int, kind: str = INDEX_TYPE) -> faiss.IndexIDMap2:
+    """
+    Build an empty inner-product index of the given kind wrapped in IndexIDMap2.
+    Embeddings are L2-normalised, so inner product is cosine similarity.
+    """
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif kind == "ivf_flat":
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFFlat(quantizer, dim, IVF_NLIST, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "ivf_pq":
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFPQ(quantizer, dim, IVF_NLIST, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif kind in ("flat_fp16", "flat_int8"):
+        base = faiss.IndexScalarQuantizer(dim, SCALAR_QUANTIZERS[kind[len("flat_"):]], faiss.METRIC_INNER_PRODUCT)
+    elif kind == "pq":
+        base = faiss.IndexPQ(dim, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+    elif kind in ("ivf_fp16", "ivf_sq8"):
+        quantizer = faiss.IndexFlatIP(dim)
+        qtype = SCALAR_QUANTIZERS["fp16" if kind == "ivf_fp16" else "int8"]
+        base = faiss.IndexIVFScalarQuantizer(quantizer, dim, IVF_NLIST, qtype, faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {INDEX_TYPES}")
+    index = faiss.IndexIDMap2(base)
+    tune_index(index)
+    return index
+
+
+def min_training_vectors(index) -> int:
+    """Vectors needed before an untrained index can be trained (0 if none)."""
+    if index.is_trained:
+        return 0
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        # PQ codebooks need a training point per centroid; scalar ranges need any data
+        return 1 << base.pq.nbits if isinstance(base, faiss.IndexPQ) else 1
+    needed = ivf.nlist
+    if isinstance(ivf, faiss.IndexIVFPQ):
+        needed = max(needed, 1 << ivf.pq.nbits)
+    return needed
+
+
+def train_index(index, vectors: np.ndarray):
+    if not index.is_trained:
+        index.train(vectors)
+    tune_index(index)
+
+
+def tune_index(index):
+    """Apply search-time parameters (nprobe / efSearch) to a loaded index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = IVF_NPROBE
+        return
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+
+
+def index_kind(index) -> str:
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVFScalarQuantizer):
+        return "ivf_fp16" if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "ivf_sq8"
+    if isinstance(base, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "flat_fp16" if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "flat_int8"
+    if isinstance(base, faiss.IndexPQ):
+        return "pq"
+    if isinstance(base, faiss.IndexFlat):
+        return "flat"
+    return type(base).__name__
+
+
+def extract_vectors(index) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (vectors, ids) for every entry of an index. Indexes without an id
+    map are positional, so their ids are 0..ntotal-1. PQ-compressed indexes
+    return their approximate reconstruction.
+    """
+    n = index.ntotal
+    if isinstance(index, faiss.IndexIDMap):
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        base = faiss.downcast_index(index.index)
+    else:
+        ids = np.arange(n, dtype=np.int64)
+        base = index
+    if n == 0:
+        return np.zeros((0, index.d), dtype=np.float32), ids
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return base.reconstruct_n(0, n).astype(np.float32), ids
+
+
+def migrate_index(index, dim: int, kind: str = INDEX_TYPE) -> faiss.IndexIDMap2:
+    """
+    Copy an existing index (including legacy positional IndexFlatL2 files)
+    into a fresh index of `kind`, keeping every vector's id.
+    """
+    vectors, ids = extract_vectors(index)
+    new_index = create_index(dim, kind)
+    if len(ids):
+        # Legacy L2 indexes may hold unnormalised vectors; IP needs unit length
+        faiss.normalize_L2(vectors)
+        if not new_index.is_trained:
+            if len(ids) < min_training_vectors(new_index):
+                raise ValueError(
+                    f"{kind} needs at least {min_training_vectors(new_index)} vectors to train, have {len(ids)}"
+                )
+            train_index(new_index, vectors)
+        new_index.add_with_ids(vectors, ids)
+    return new_index
+
+
+def remove_ids(index, ids: np.ndarray) -> int:
+    """
+    index.remove_ids that is also correct for IVF inside IndexIDMap2: the id
+    map compacts as if the base shifted its entries down (as flat storage
+    does), but IVF keeps its old sequential labels, so shift those to match.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    ivf = faiss.try_extract_index_ivf(index) if isinstance(index, faiss.IndexIDMap) else None
+    if ivf is None:
+        return index.remove_ids(faiss.IDSelectorBatch(ids))
+    positions = np.flatnonzero(np.isin(faiss.vector_to_array(index.id_map), ids))
+    if ivf.direct_map.type != faiss.DirectMap.NoMap:
+        ivf.make_direct_map(False)
+    removed = index.remove_ids(faiss.IDSelectorBatch(ids))
+    if removed:
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                labels = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+                labels -= np.searchsorted(positions, labels)
+    return removed
@@ -0,0 +1,72 @@
+"""
+Bulk-import every PDF/DOCX under a directory.
+
+Writes the index files directly, so stop the API first; it refuses to run while
+the API has them open. To import into a running server, use /upload/bulk/.
+
+    python ingest.py ./docs --batch-size 128 --batch-docs 64
+    python ingest.py ./hr-docs --collection hr
+"""
+import argparse
+import os
+import time
+
+
+def find_files(root):
+    from extraction import is_supported
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if is_supported(name):
+                yield os.path.join(dirpath, name)
+
+
+def document_name(path, root):
+    """Path relative to the import root, so a/report.pdf and b/report.pdf stay separate documents."""
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import documents into the index")
+    parser.add_argument("directory")
+    parser.add_argument("--batch-size", type=int, default=None, help="texts per encode call")
+    parser.add_argument("--batch-docs", type=int, default=None, help="documents per index commit")
+    parser.add_argument("--collection", default=None, help="collection to import into (default: 'default')")
+    args = parser.parse_args()
+
+    # Imported here so extraction worker processes don't load the model
+    import main as backend
+    from vector_store import StoreLocked
+    try:
+        backend.initialize()
+    except StoreLocked as e:
+        raise SystemExit(f"{e}; stop the API before importing, or send the files to /upload/bulk/")
+
+    batch_size = args.batch_size or backend.EMBED_BATCH_SIZE
+    batch_docs = args.batch_docs or backend.INGEST_BATCH_DOCS
+    collection = args.collection or backend.DEFAULT_COLLECTION
+    if not backend.valid_collection(collection):
+        raise SystemExit(f"Invalid collection name '{collection}'")
+
+    start = time.perf_counter()
+    indexed = failed = 0
+    paths = list(find_files(args.directory))
+    for i in range(0, len(paths), batch_docs):
+        files = []
+        for path in paths[i:i + batch_docs]:
+            with open(path, "rb") as f:
+                files.append((document_name(path, args.directory), f.read()))
+        report = backend.ingest_files(files, batch_size=batch_size, batch_docs=batch_docs, collection=collection)
+        indexed += report["indexed"]
+        failed += report["failed"]
+        for result in report["results"]:
+            if "error" in result:
+                print(f"skipped {result['filename']}: {result['error']}")
+        print(f"{i + len(files)}/{len(paths)} files, {report['docs_per_sec']} docs/sec in last batch")
+
+    elapsed = time.perf_counter() - start
+    rate = indexed / elapsed if elapsed > 0 else 0.0
+    print(f"Indexed {indexed} documents ({failed} skipped) in {elapsed:.1f}s: {rate:.2f} docs/sec")
+
+
+if __name__ == "__main__":
+    main()
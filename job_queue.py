@@ -0,0 +1,95 @@
+import os
+import socket
+import threading
+import uuid
+from os import getenv
+from typing import Callable, List, Optional
+
+# Background ingestion: worker threads, and how often idle workers re-check the queue
+INGEST_WORKERS = int(getenv("INGEST_WORKERS", "2"))
+INGEST_POLL_SECONDS = float(getenv("INGEST_POLL_SECONDS", "2"))
+# Running jobs are heartbeated this often; one whose heartbeat is older than INGEST_STALE_SECONDS
+# belongs to a worker that died and is re-queued by whichever process notices first
+INGEST_HEARTBEAT_SECONDS = float(getenv("INGEST_HEARTBEAT_SECONDS", "15"))
+INGEST_STALE_SECONDS = float(getenv("INGEST_STALE_SECONDS", "120"))
+# Names this process on the jobs it claims; unique even when a pid is reused after a restart
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobWorkers:
+    """
+    Threads that claim jobs from a persistent queue and run them.
+
+    `claim()` atomically marks the oldest queued job as running and returns
+    its id (None when the queue is empty); `run(job_id)` processes it.
+    The queue itself lives in the database, so jobs survive restarts;
+    notify() just wakes idle workers early instead of waiting for the poll.
+    `heartbeat(job_ids)` is called every `heartbeat_seconds` with the jobs
+    this process is running, to keep them claimed and reclaim dead ones.
+    """
+
+    def __init__(self, claim: Callable[[], Optional[int]], run: Callable[[int], None],
+                 workers: int = INGEST_WORKERS, poll_seconds: float = INGEST_POLL_SECONDS,
+                 heartbeat: Optional[Callable[[List[int]], None]] = None,
+                 heartbeat_seconds: float = INGEST_HEARTBEAT_SECONDS):
+        self.claim = claim
+        self.run = run
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.heartbeat = heartbeat
+        self.heartbeat_seconds = heartbeat_seconds
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"ingest-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if self.heartbeat is not None:
+            thread = threading.Thread(target=self._beat, name="ingest-heartbeat", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def notify(self):
+        self.wake.set()
+
+    def stop(self, timeout: float = 5.0):
+        self.stopping.set()
+        self.wake.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            try:
+                job_id = self.claim()
+            except Exception as e:
+                print(f"Ingest queue unavailable: {e}")
+                job_id = None
+            if job_id is None:
+                self.wake.wait(self.poll_seconds)
+                self.wake.clear()
+                continue
+            with self.lock:
+                self.running.add(job_id)
+            try:
+                self.run(job_id)
+            except Exception as e:
+                print(f"Ingest job {job_id} crashed: {e}")
+            finally:
+                with self.lock:
+                    self.running.discard(job_id)
+
+    def _beat(self):
+        while not self.stopping.wait(self.heartbeat_seconds):
+            with self.lock:
+                running = sorted(self.running)
+            try:
+                self.heartbeat(running)
+            except Exception as e:
+                print(f"Ingest heartbeat failed: {e}")
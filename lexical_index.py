@@ -0,0 +1,111 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from os import getenv
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# BM25 parameters and reciprocal-rank fusion constant
+BM25_K1 = float(getenv("BM25_K1", "1.2"))
+BM25_B = float(getenv("BM25_B", "0.75"))
+RRF_K = int(getenv("RRF_K", "60"))
+
+# Words, plus codes such as "RP-4471" or "v2.3.1" kept whole
+TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+# Ignored in queries (documents keep them, so lengths match the indexed text): they match
+# nearly every passage and would let any question clear the relevance gate on BM25 alone
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how i if in into is it its
+me my no not of on or our should so than that the their them then there these they this those to was we
+were what when where which who whom why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        tokens.append(token)
+        # Also index the parts, so "4471" matches "RP-4471"
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+    return tokens
+
+
+class BM25Index:
+    """In-process inverted index with BM25 scoring, keyed by FAISS id and updated incrementally."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc id: term frequency}
+        self.doc_terms = {}  # doc id -> Counter, kept for removal
+        self.doc_length = {}
+        self.total_length = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, ids: Iterable[int], texts: Iterable[str]):
+        with self.lock:
+            for doc_id, text in zip(ids, texts):
+                doc_id = int(doc_id)
+                if doc_id in self.doc_terms:
+                    self._remove_one(doc_id)
+                terms = Counter(tokenize(text))
+                self.doc_terms[doc_id] = terms
+                self.doc_length[doc_id] = sum(terms.values())
+                self.total_length += self.doc_length[doc_id]
+                for term, tf in terms.items():
+                    self.postings[term][doc_id] = tf
+
+    def remove(self, ids: Iterable[int]):
+        with self.lock:
+            for doc_id in ids:
+                self._remove_one(int(doc_id))
+
+    def _remove_one(self, doc_id: int):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_length.pop(doc_id)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        terms = set(tokenize(query)) - STOPWORDS
+        with self.lock:
+            n = len(self.doc_terms)
+            if not n or not terms:
+                return []
+            avg_length = self.total_length / n
+            scores = defaultdict(float)
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_length[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def rrf_fuse(rankings: Sequence[Tuple[Sequence[int], float]], k: int = RRF_K) -> Dict[int, float]:
+    """
+    Reciprocal-rank fusion of several ranked id lists, each with a weight.
+    Returns id -> fused score, best first.
+    """
+    fused = defaultdict(float)
+    for ids, weight in rankings:
+        if weight <= 0:
+            continue
+        for rank, doc_id in enumerate(ids):
+            fused[doc_id] += weight / (k + rank + 1)
+    return dict(sorted(fused.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,239 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from os import getenv
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+import groq
+
+# LLM calls running at once, and the provider quota as requests / tokens per minute (0 = unlimited)
+LLM_MAX_CONCURRENCY = int(getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_REQUESTS_PER_MINUTE = float(getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Calls waiting for admission beyond this are rejected (HTTP 429), as are calls that would wait too long
+LLM_MAX_QUEUE = int(getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT = float(getenv("LLM_QUEUE_TIMEOUT", "30"))
+# Retries of rate-limited / unavailable calls, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE = float(getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_MAX = float(getenv("LLM_RETRY_MAX", "8"))
+
+
+class LLMOverloaded(Exception):
+    """The call was shed instead of queued; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 per second up to one minute's worth; 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the bucket wait for a full one)."""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.available) / self.rate)
+
+    def take(self, amount: float):
+        if self.rate:
+            self._refill()
+            self.available -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        if self.rate:
+            self._refill()
+            self.available = min(self.capacity, self.available + amount)
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result (or exception)."""
+
+    def __init__(self):
+        self.flights: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable]):
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            # shield: a follower giving up must not cancel the shared call
+            return await asyncio.shield(flight)
+        flight = asyncio.ensure_future(func())
+        self.flights[key] = flight
+        flight.add_done_callback(lambda _: self.flights.pop(key, None))
+        return await asyncio.shield(flight)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (groq.RateLimitError, groq.APIConnectionError)):
+        return True
+    return getattr(error, "status_code", 0) >= 500
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """
+    Admission control for outbound LLM calls.
+
+    A call first joins a bounded FIFO queue (LLM_MAX_QUEUE); beyond that,
+    or if it would wait longer than LLM_QUEUE_TIMEOUT, it is rejected with
+    LLMOverloaded so the API can answer 429 instead of piling up. At the head
+    of the queue it waits for the request and token buckets (sized to the
+    provider quota) and for one of LLM_MAX_CONCURRENCY slots. Tokens are
+    reserved as prompt + max_tokens and the unused part is refunded once the
+    real usage is known. Rate-limit and 5xx errors are retried with jittered
+    exponential backoff, honouring Retry-After.
+    """
+
+    def __init__(self, concurrency: int = LLM_MAX_CONCURRENCY, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, max_queue: int = LLM_MAX_QUEUE,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 on_wait: Optional[Callable[[float], None]] = None):
+        self.concurrency = concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.on_wait = on_wait
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+        # Created lazily: they bind to the running event loop
+        self._turn = None
+        self._slots = None
+
+    def _primitives(self):
+        if self._turn is None:
+            self._turn = asyncio.Lock()  # FIFO: one waiter at a time checks the buckets
+            self._slots = asyncio.Semaphore(self.concurrency) if self.concurrency else None
+        return self._turn, self._slots
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        raise LLMOverloaded(f"LLM {reason}, try again later", retry_after=round(max(retry_after, 1.0), 1))
+
+    async def admit(self, tokens: int):
+        """Wait for a call slot reserving `tokens`; pair with release(). Raises LLMOverloaded."""
+        if self.waiting >= self.max_queue:
+            self._reject("queue is full", self.queue_timeout / 2)
+        turn, slots = self._primitives()
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        self.waiting += 1
+        try:
+            try:
+                await asyncio.wait_for(turn.acquire(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                self._reject("queue wait timed out", self.queue_timeout / 2)
+            try:
+                while True:
+                    delay = max(self.requests.delay(1), self.tokens.delay(tokens))
+                    if not delay:
+                        break
+                    if time.monotonic() + delay > deadline:
+                        self._reject("rate limit reached", delay)
+                    await asyncio.sleep(delay)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+            finally:
+                turn.release()
+            if slots is not None:
+                try:
+                    await asyncio.wait_for(slots.acquire(), max(deadline - time.monotonic(), 0.001))
+                except asyncio.TimeoutError:
+                    self.requests.give(1)
+                    self.tokens.give(tokens)
+                    self._reject("concurrency limit reached", self.queue_timeout / 2)
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - start
+        self.wait_seconds += waited
+        self.admitted += 1
+        self.in_flight += 1
+        if self.on_wait is not None:
+            self.on_wait(waited)
+
+    def release(self, reserved: int, used: Optional[int] = None):
+        """Free the slot; `used` (the response's total tokens) refunds the rest of the reservation."""
+        self.in_flight -= 1
+        _, slots = self._primitives()
+        if slots is not None:
+            slots.release()
+        if used is not None and used < reserved:
+            self.tokens.give(reserved - used)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        """
+        Hold an admitted call slot. Set `usage["tokens"]` on the yielded dict
+        to refund the unused part of the reservation.
+        """
+        await self.admit(tokens)
+        usage = {}
+        try:
+            yield usage
+        finally:
+            self.release(tokens, usage.get("tokens"))
+
+    async def with_retries(self, create: Callable[..., Awaitable], **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await create(**kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                attempt += 1
+                self.retries += 1
+                # Full jitter keeps a burst of rejected calls from retrying in lockstep
+                delay = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt))
+                await asyncio.sleep(max(delay, retry_after(e) or 0.0))
+
+    async def call(self, create: Callable[..., Awaitable], tokens: int, **kwargs):
+        """Admit, then run `create(**kwargs)` with retries; refunds tokens from the response's usage."""
+        async with self.slot(tokens) as usage:
+            response = await self.with_retries(create, **kwargs)
+            # Missing usage (or a partial one) just means the reservation isn't refunded
+            usage["tokens"] = getattr(getattr(response, "usage", None), "total_tokens", None)
+            return response
+
+    def stats(self) -> Dict:
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "max_queue": self.max_queue,
+            "concurrency": self.concurrency,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "avg_wait_ms": round(self.wait_seconds / self.admitted * 1000, 3) if self.admitted else None,
+            "requests_available": round(self.requests.available, 1) if self.requests.rate else None,
+            "tokens_available": round(self.tokens.available) if self.tokens.rate else None,
+        }
@@ -0,0 +1,162 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Histogram buckets in seconds, from cache hits to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield self.name + _labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    """Set directly, or computed at scrape time by `func` returning a value or {label tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 func: Optional[Callable] = None, kind: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.func = func
+        self.kind = kind  # "counter" for monotonic values read from elsewhere, e.g. cache hits
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        if self.func is None:
+            yield from super().samples()
+            return
+        value = self.func()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for key, v in items:
+            yield self.name + _labels(self.labelnames, key), v
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label tuple -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield self.name + "_bucket" + _labels(self.labelnames, key, f'le="{_number(bound)}"'), cumulative
+            yield self.name + "_bucket" + _labels(self.labelnames, key, 'le="+Inf"'), count
+            yield self.name + "_sum" + _labels(self.labelnames, key), total
+            yield self.name + "_count" + _labels(self.labelnames, key), count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for sample, value in metric.samples():
+                    lines.append(f"{sample} {_number(value)}")
+            except Exception as e:
+                # One broken gauge shouldn't take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {type(e).__name__}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Time spent in each stage of the upload and query pipelines", ("pipeline", "stage")
+))
+
+# Per-request stage timings (ms), shared with tasks the request spawns
+_timings = contextvars.ContextVar("rag_timings", default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(pipeline: str, stage: str):
+    """Time a stage into rag_stage_seconds and, inside a request, its `timings`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, pipeline=pipeline, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed * 1000, 3)
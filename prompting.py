@@ -0,0 +1,187 @@
+from os import getenv
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cache import LRUCache, digest
+
+# Token budgets
+MODEL_CONTEXT_WINDOW = int(getenv("MODEL_CONTEXT_WINDOW", "131072"))
+PROMPT_TOKEN_BUDGET = int(getenv("PROMPT_TOKEN_BUDGET", "6000"))
+MAX_COMPLETION_TOKENS = int(getenv("MAX_COMPLETION_TOKENS", "1000"))
+HISTORY_SHARE = float(getenv("HISTORY_SHARE", "0.3"))  # of the budget left after the template
+SUMMARY_MAX_TOKENS = int(getenv("SUMMARY_MAX_TOKENS", "300"))
+TOKENIZER_ENCODING = getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+SYSTEM_PROMPT = "You are a strict document-based QA assistant."
+
+PROMPT_TEMPLATE = """
+    You are a helpful and smart assistant.
+
+    Use the DOCUMENTS below and the prior CHAT CONTEXT to answer the QUESTION.
+    If the document has the answer — prioritize it. If not, use your reasoning based on the conversation to respond.
+
+    DOCUMENTS:
+    {documents}
+
+    CHAT CONTEXT:
+    {context}
+
+    QUESTION:
+    {question}
+
+    Respond concisely and clearly.
+    """
+
+# Per-message overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 8
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            # tiktoken downloads its tables on first use; estimate if that fails
+            print(f"tiktoken unavailable ({type(e).__name__}), estimating 4 characters per token")
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        tokens = tokens[-max_tokens:] if keep_end else tokens[:max_tokens]
+        return encoding.decode(tokens)
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[-max_chars:] if keep_end else text[:max_chars]
+
+
+def format_turns(turns: List[Dict]) -> str:
+    return "\n".join(f"User: {turn['q']}\nAgent: {turn['a']}" for turn in turns)
+
+
+class PromptAssembler:
+    """
+    Builds the chat messages for a question within a token budget.
+
+    The budget (PROMPT_TOKEN_BUDGET, capped so prompt plus completion fits
+    MODEL_CONTEXT_WINDOW) first pays for the template and question. Up to
+    HISTORY_SHARE of the rest goes to chat history: recent turns verbatim,
+    older turns folded into a running summary that is cached per prefix of
+    the conversation, so each new turn costs at most one small summary call.
+    Retrieved passages get everything left, in rank order, with the last one
+    truncated to fit.
+    """
+
+    def __init__(self, summarize: Callable[[str, str, int], Awaitable[str]], summary_cache_size: int = 512):
+        # summarize(previous_summary, new_turns_text, max_tokens) -> summary
+        self.summarize = summarize
+        self.summaries = LRUCache("summary", summary_cache_size)
+
+    async def build(self, question: str, passages: List[Dict], history: Optional[List[Dict]] = None,
+                    context: str = "") -> Tuple[List[Dict], Dict]:
+        budget = min(PROMPT_TOKEN_BUDGET, MODEL_CONTEXT_WINDOW - MAX_COMPLETION_TOKENS)
+        fixed = (
+            count_tokens(SYSTEM_PROMPT)
+            + count_tokens(PROMPT_TEMPLATE.format(documents="", context="", question=""))
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        question = truncate_to_tokens(question, max(budget // 4, 1))
+        remaining = max(budget - fixed - count_tokens(question), 0)
+
+        history_text = await self._history(history or [], context, int(remaining * HISTORY_SHARE))
+        remaining -= count_tokens(history_text)
+
+        documents, used_passages = self._passages(passages, remaining)
+        prompt = PROMPT_TEMPLATE.format(documents=documents, context=history_text, question=question)
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+        prompt_tokens = count_tokens(SYSTEM_PROMPT) + count_tokens(prompt) + 2 * MESSAGE_OVERHEAD_TOKENS
+        stats = {
+            "prompt_tokens": prompt_tokens,
+            "max_tokens": max(min(MAX_COMPLETION_TOKENS, MODEL_CONTEXT_WINDOW - prompt_tokens), 1),
+            "passages_used": used_passages,
+            "history_tokens": count_tokens(history_text),
+        }
+        return messages, stats
+
+    def _passages(self, passages: List[Dict], budget: int) -> Tuple[str, int]:
+        blocks = []
+        for p in passages:
+            header = f"{p['filename']} (offset {p['offset']}):\n"
+            cost = count_tokens(header) + 2
+            if budget - cost <= 0:
+                break
+            text = truncate_to_tokens(p["text"], budget - cost)
+            blocks.append(header + text)
+            budget -= cost + count_tokens(text)
+        return "\n\n".join(blocks), len(blocks)
+
+    async def _history(self, history: List[Dict], context: str, budget: int) -> str:
+        if budget <= 0:
+            return ""
+        if not history:
+            # Pre-formatted context from older clients: keep the most recent part
+            return truncate_to_tokens(context, budget, keep_end=True)
+
+        # Newest turns verbatim while they fit in what the summary leaves
+        summary_budget = min(SUMMARY_MAX_TOKENS, budget // 3)
+        recent = []
+        used = 0
+        for turn in reversed(history):
+            cost = count_tokens(format_turns([turn])) + 1
+            if used + cost > budget - summary_budget:
+                break
+            recent.insert(0, turn)
+            used += cost
+        older = history[:len(history) - len(recent)]
+        if not older:
+            return format_turns(recent)
+
+        summary = await self._summary(older, summary_budget)
+        parts = [f"Summary of earlier conversation: {summary}"] if summary else []
+        if recent:
+            parts.append(format_turns(recent))
+        return truncate_to_tokens("\n".join(parts), budget, keep_end=True)
+
+    async def _summary(self, turns: List[Dict], max_tokens: int) -> str:
+        key = digest([(t["q"], t["a"]) for t in turns], max_tokens)
+        cached = self.summaries.get(key)
+        if cached is not None:
+            return cached
+        # Extend the longest already-summarised prefix instead of starting over
+        previous = ""
+        start = 0
+        for cut in range(len(turns) - 1, 0, -1):
+            prefix = self.summaries.get(digest([(t["q"], t["a"]) for t in turns[:cut]], max_tokens))
+            if prefix is not None:
+                previous, start = prefix, cut
+                break
+        new_text = format_turns(turns[start:])
+        try:
+            summary = await self.summarize(previous, new_text, max_tokens)
+        except Exception:
+            # Keep the conversation usable without the LLM: clip instead of summarising
+            summary = truncate_to_tokens((previous + "\n" + new_text).strip(), max_tokens, keep_end=True)
+        summary = truncate_to_tokens(summary.strip(), max_tokens)
+        self.summaries.set(key, summary)
+        return summary
@@ -0,0 +1,153 @@
+"""
+Rebuild or migrate faiss_index.bin into another index engine, keeping ids.
+
+    python rebuild_index.py --type hnsw --report
+    python rebuild_index.py --type ivf_pq --reembed
+    python rebuild_index.py --type ivf_flat --report --dry-run
+    python rebuild_index.py --type ivf_sq8 --reembed    # compressed; see bench_storage.py
+    python rebuild_index.py --type hnsw --collection hr  # one collection's shard
+
+--report compares recall@k and per-query latency of the new index against
+an exact flat inner-product baseline built from the same vectors.
+
+Stop the API server first: it holds the index in memory and would
+overwrite the rebuilt file with its next snapshot.
+"""
+import argparse
+import os
+import shutil
+import time
+
+import faiss
+import numpy as np
+
+from index_engine import INDEX_TYPES, create_index, min_training_vectors, train_index
+
+
+def build_index(vectors, ids, dim, kind):
+    index = create_index(dim, kind)
+    if not index.is_trained:
+        needed = min_training_vectors(index)
+        if len(ids) < needed:
+            raise SystemExit(f"'{kind}' needs at least {needed} vectors to train, corpus has {len(ids)}")
+        train_index(index, vectors)
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def reembed_vectors(backend, collection):
+    """Re-encode every chunk (and legacy whole-document row) of a collection from the database."""
+    db = backend.SessionLocal()
+    Document, DocumentChunk = backend.Document, backend.DocumentChunk
+    rows = (
+        db.query(DocumentChunk.faiss_id, DocumentChunk.text)
+        .join(Document, Document.id == DocumentChunk.document_id)
+        .filter(Document.collection == collection)
+        .all()
+    )
+    chunked_docs = {doc_id for (doc_id,) in db.query(DocumentChunk.document_id).distinct()}
+    legacy = [
+        (faiss_index, content or "")
+        for doc_id, faiss_index, content in db.query(Document.id, Document.faiss_index, backend.content_prefix())
+        .filter(Document.faiss_index.isnot(None), Document.collection == collection)
+        if doc_id not in chunked_docs
+    ]
+    db.close()
+    rows = list(rows) + legacy
+    ids = np.array([faiss_id for faiss_id, _ in rows], dtype=np.int64)
+    if not rows:
+        return np.zeros((0, backend.embedding_dim), dtype=np.float32), ids
+    # Unchanged chunks come from the content cache instead of the model
+    return backend.embed_chunks([text for _, text in rows]), ids
+
+
+def latency_recall(index, queries, k, truth=None):
+    timings = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        timings.append(time.perf_counter() - start)
+        results.append(ids[0])
+    timings_ms = np.array(timings) * 1000
+    report = {
+        "p50_ms": float(np.percentile(timings_ms, 50)),
+        "p99_ms": float(np.percentile(timings_ms, 99)),
+        "mean_ms": float(timings_ms.mean()),
+    }
+    if truth is not None:
+        hits = sum(len(set(r[r != -1]) & set(t[t != -1])) for r, t in zip(results, truth))
+        report["recall"] = hits / max(sum(int((t != -1).sum()) for t in truth), 1)
+    return report, results
+
+
+def recall_report(candidate, vectors, ids, k=10, num_queries=200, seed=0):
+    """Recall@k and latency of `candidate` against an exact flat baseline."""
+    baseline = build_index(vectors, ids, vectors.shape[1], "flat")
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    # Perturbed corpus vectors stand in for real questions
+    queries = vectors[picks] + rng.normal(scale=0.05, size=(len(picks), vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+
+    base_stats, truth = latency_recall(baseline, queries, k)
+    cand_stats, _ = latency_recall(candidate, queries, k, truth)
+    return {"flat": base_stats, "candidate": cand_stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the FAISS index with another engine")
+    parser.add_argument("--type", choices=INDEX_TYPES, default=None, help="target engine (default FAISS_INDEX_TYPE)")
+    parser.add_argument("--reembed", action="store_true", help="re-encode chunk text instead of copying vectors")
+    parser.add_argument("--report", action="store_true", help="print recall vs latency against flat")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="build and report without replacing the index file")
+    parser.add_argument("--collection", default=None, help="collection whose shard to rebuild (default: 'default')")
+    args = parser.parse_args()
+
+    import main as backend
+    backend.initialize()
+
+    collection = args.collection or backend.DEFAULT_COLLECTION
+    if not backend.collection_exists(collection):
+        raise SystemExit(f"Unknown collection '{collection}'")
+    with backend.shards.acquire(collection) as shard:
+        rebuild(backend, shard, args)
+    backend.shards.close()
+
+
+def rebuild(backend, shard, args):
+    kind = args.type or backend.INDEX_TYPE
+    if args.reembed:
+        vectors, ids = reembed_vectors(backend, shard.name)
+    else:
+        # Includes vectors still in the mmap delta; deleted but not yet compacted ones must not come back
+        vectors, ids = shard.vectors.export()
+        faiss.normalize_L2(vectors)
+    print(f"Building '{kind}' index from {len(ids)} vectors")
+
+    start = time.perf_counter()
+    new_index = build_index(vectors, ids, backend.embedding_dim, kind)
+    print(f"Built in {time.perf_counter() - start:.1f}s")
+
+    if args.report and len(ids):
+        report = recall_report(new_index, vectors, ids, k=args.k, num_queries=args.queries)
+        print(f"{'engine':<10} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"{'flat':<10} {1.0:>10.3f} {report['flat']['p50_ms']:>8.3f} {report['flat']['p99_ms']:>8.3f}")
+        c = report["candidate"]
+        print(f"{kind:<10} {c['recall']:>10.3f} {c['p50_ms']:>8.3f} {c['p99_ms']:>8.3f}")
+
+    if args.dry_run:
+        return
+    path = shard.vectors.path
+    if os.path.exists(path):
+        shutil.copy2(path, path + ".bak")
+    # Snapshots atomically and clears the replayed vector log
+    shard.vectors.swap(new_index, vectors, ids)
+    print(f"Wrote {path} ({new_index.ntotal} vectors); previous index kept at {path}.bak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from os import getenv
+from typing import Dict, Optional
+
+# A hit is relevant when its cosine similarity or its BM25 score reaches these; calibrate
+# both with calibrate_thresholds.py. A threshold of 0 means that retriever admits nothing
+# on its own; both 0 turn gating off. BM25 scores count only non-stopword query terms, so
+# the lexical floor passes exact codes and rare terms, not "what is the".
+MIN_VECTOR_SCORE = float(getenv("MIN_VECTOR_SCORE", "0.25"))
+MIN_LEXICAL_SCORE = float(getenv("MIN_LEXICAL_SCORE", "1.0"))
+# Adaptive k: drop hits whose cosine similarity trails the best hit's by more than this (0 = keep top_k)
+MAX_SCORE_GAP = float(getenv("MAX_SCORE_GAP", "0.15"))
+
+
+def is_relevant(hit: Dict, min_vector: float, min_lexical: float) -> bool:
+    if not min_vector and not min_lexical:
+        return True
+    vector = hit.get("vector_score")
+    if min_vector and vector is not None and vector >= min_vector:
+        return True
+    return passes_lexical(hit, min_lexical)
+
+
+def passes_lexical(hit: Dict, min_lexical: float) -> bool:
+    lexical = hit.get("lexical_score")
+    return bool(min_lexical) and lexical is not None and lexical >= min_lexical
+
+
+def select_hits(hits: Dict[int, Dict], min_vector: float = MIN_VECTOR_SCORE, min_lexical: float = MIN_LEXICAL_SCORE,
+                max_gap: float = MAX_SCORE_GAP) -> Dict[int, Dict]:
+    """
+    Keep the fused hits that pass the thresholds, then cut the ones admitted
+    on cosine similarity that fall more than `max_gap` below the best, so a
+    clear best match isn't padded out with weak context. Hits that pass the
+    lexical threshold are kept regardless of the gap. Order is preserved; an
+    empty result means nothing is worth sending to the LLM.
+    """
+    kept = {faiss_id: hit for faiss_id, hit in hits.items() if is_relevant(hit, min_vector, min_lexical)}
+    best = best_scores(kept)["vector_score"]
+    if not max_gap or best is None:
+        return kept
+    return {
+        faiss_id: hit for faiss_id, hit in kept.items()
+        # A strong BM25 match (an exact code) stands on its own score, whatever its cosine
+        if passes_lexical(hit, min_lexical) or hit.get("vector_score") is None
+        or hit["vector_score"] >= best - max_gap
+    }
+
+
+def best_scores(hits: Dict[int, Dict]) -> Dict[str, Optional[float]]:
+    """Highest cosine similarity and BM25 score among `hits` (None if no hit has one)."""
+    best = {}
+    for name in ("vector_score", "lexical_score"):
+        scores = [hit[name] for hit in hits.values() if hit.get(name) is not None]
+        best[name] = max(scores) if scores else None
+    return best
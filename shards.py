@@ -0,0 +1,170 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from os import getenv
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+from lexical_index import rrf_fuse
+
+# Uploads without a collection go here; its shard is the original faiss_index.bin and is never unloaded
+DEFAULT_COLLECTION = "default"
+# Other collections keep their index files under SHARD_DIR/<name>/
+SHARD_DIR = getenv("SHARD_DIR", "shards")
+# Resident shards beyond this are unloaded, least recently used first (0 = no limit)
+MAX_LOADED_SHARDS = int(getenv("MAX_LOADED_SHARDS", "0"))
+# Threads searching the shards of one query in parallel
+SHARD_SEARCH_WORKERS = int(getenv("SHARD_SEARCH_WORKERS", "8"))
+
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def valid_collection(name: str) -> bool:
+    return bool(COLLECTION_NAME.match(name or ""))
+
+
+class Shard:
+    """One collection's vector store and BM25 index."""
+
+    def __init__(self, name: str, vectors, lexical):
+        self.name = name
+        self.vectors = vectors
+        self.lexical = lexical
+        self.users = 0
+        self.last_used = time.monotonic()
+
+
+class ShardManager:
+    """
+    Named collections, each searched through its own Shard.
+
+    Shards are opened by `open_shard(name)` on first use and held while
+    someone is inside acquire(). Once more than `max_loaded` are resident,
+    idle ones are unloaded least recently used first; closing the vector
+    store snapshots it, so loading it again only reads the snapshot.
+    Pinned shards stay loaded.
+    """
+
+    def __init__(self, open_shard: Callable[[str], Shard], max_loaded: int = MAX_LOADED_SHARDS,
+                 workers: int = SHARD_SEARCH_WORKERS, pinned: Iterable[str] = (DEFAULT_COLLECTION,)):
+        self.open_shard = open_shard
+        self.max_loaded = max_loaded
+        self.pinned = set(pinned)
+        self.shards: Dict[str, Shard] = {}
+        self.lock = threading.Lock()
+        self.loading = {}  # name -> lock held while that shard is opened or closed
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-search")
+
+    def loaded(self) -> List[Shard]:
+        with self.lock:
+            return list(self.shards.values())
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.shards
+
+    def _name_lock(self, name: str) -> threading.Lock:
+        with self.lock:
+            return self.loading.setdefault(name, threading.Lock())
+
+    def _checkout(self, name: str) -> Shard:
+        with self.lock:
+            shard = self.shards.get(name)
+            if shard is not None:
+                shard.users += 1
+                shard.last_used = time.monotonic()
+                return shard
+        with self._name_lock(name):
+            with self.lock:
+                shard = self.shards.get(name)
+                if shard is not None:
+                    shard.users += 1
+                    shard.last_used = time.monotonic()
+                    return shard
+            start = time.perf_counter()
+            shard = self.open_shard(name)
+            shard.users = 1
+            with self.lock:
+                self.shards[name] = shard
+            print(f"Loaded shard '{name}' in {time.perf_counter() - start:.2f}s")
+        self._evict()
+        return shard
+
+    def _release(self, shard: Shard):
+        with self.lock:
+            shard.users -= 1
+            shard.last_used = time.monotonic()
+        self._evict()
+
+    @contextmanager
+    def acquire(self, name: str):
+        """The shard of `name`, loaded if needed and kept loaded until the block exits."""
+        shard = self._checkout(name)
+        try:
+            yield shard
+        finally:
+            self._release(shard)
+
+    def load(self, name: str):
+        with self.acquire(name):
+            pass
+
+    def unload(self, name: str) -> bool:
+        """Close an idle, unpinned shard; False if it isn't loaded, is pinned or is in use."""
+        with self._name_lock(name):
+            with self.lock:
+                shard = self.shards.get(name)
+                if shard is None or shard.users or name in self.pinned:
+                    return False
+                del self.shards[name]
+            shard.vectors.close()
+        print(f"Unloaded shard '{name}'")
+        return True
+
+    def _evict(self):
+        if not self.max_loaded:
+            return
+        with self.lock:
+            excess = len(self.shards) - self.max_loaded
+            if excess <= 0:
+                return
+            idle = sorted(
+                (s for s in self.shards.values() if not s.users and s.name not in self.pinned),
+                key=lambda s: s.last_used,
+            )
+            victims = [s.name for s in idle[:excess]]
+        for name in victims:
+            self.unload(name)
+
+    def search(self, names: List[str], queries: np.ndarray, k: int):
+        """Dense search over the shards of `names` in parallel, merged into a global top-k per query."""
+        with ExitStack() as stack:
+            shards = [stack.enter_context(self.acquire(name)) for name in names]
+            if len(shards) == 1:
+                return shards[0].vectors.search(queries, k)
+            results = list(self.pool.map(lambda shard: shard.vectors.search(queries, k), shards))
+        # Ids are unique across shards, so merging is a sort on score
+        scores = np.hstack([scores for scores, _ in results])
+        ids = np.hstack([ids for _, ids in results])
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def lexical_search(self, names: List[str], query: str, k: int) -> List:
+        """BM25 over the shards of `names`, merged by reciprocal rank."""
+        with ExitStack() as stack:
+            shards = [stack.enter_context(self.acquire(name)) for name in names]
+            if len(shards) == 1:
+                return shards[0].lexical.search(query, k)
+            results = list(self.pool.map(lambda shard: shard.lexical.search(query, k), shards))
+        # BM25 scores depend on each shard's own document statistics, so merge by rank instead;
+        # every hit keeps its shard's score for the relevance threshold
+        scores = {faiss_id: score for result in results for faiss_id, score in result}
+        fused = rrf_fuse([([faiss_id for faiss_id, _ in result], 1.0) for result in results])
+        return [(faiss_id, scores[faiss_id]) for faiss_id in list(fused)[:k]]
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        for shard in self.loaded():
+            shard.vectors.close()
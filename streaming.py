@@ -0,0 +1,105 @@
+import json
+import re
+from typing import Dict
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+BOLD = "**"
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _partial_suffix(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of tag."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+class ThinkStripper:
+    """
+    Removes `<think>...</think>` sections (optionally wrapped in `**`) from a
+    token stream as it arrives, so reasoning never reaches the client.
+    Text that might be the start of a tag is held back until it is resolved.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_think = False
+        self.after_think = False  # strip a `**` that directly follows a block
+        self.started = False  # strip leading whitespace of the answer
+
+    def feed(self, text: str) -> str:
+        self.buffer += text
+        out = []
+        while self.buffer:
+            if self.in_think:
+                end = self.buffer.find(THINK_CLOSE)
+                if end == -1:
+                    # Keep only what could be the start of the closing tag
+                    keep = _partial_suffix(self.buffer, THINK_CLOSE)
+                    self.buffer = self.buffer[len(self.buffer) - keep:] if keep else ""
+                    break
+                self.buffer = self.buffer[end + len(THINK_CLOSE):]
+                self.in_think = False
+                self.after_think = True
+                continue
+
+            if self.after_think:
+                # Only a `**` directly after the closing tag belongs to the block
+                if self.buffer.startswith(BOLD):
+                    self.buffer = self.buffer[len(BOLD):]
+                elif BOLD.startswith(self.buffer):
+                    break
+                self.after_think = False
+                continue
+
+            start = self.buffer.find(THINK_OPEN)
+            if start != -1:
+                before = self.buffer[:start]
+                if before.endswith(BOLD):
+                    before = before[:-len(BOLD)]
+                out.append(before)
+                self.buffer = self.buffer[start + len(THINK_OPEN):]
+                self.in_think = True
+                continue
+
+            # Hold back a possible partial `<think>` (and a `**` right before it)
+            keep = _partial_suffix(self.buffer, THINK_OPEN)
+            if not keep and self.buffer.endswith(("*", BOLD)):
+                keep = 2 if self.buffer.endswith(BOLD) else 1
+            elif keep and self.buffer[:len(self.buffer) - keep].endswith(BOLD):
+                keep += len(BOLD)
+            out.append(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+
+        return self._emit("".join(out))
+
+    def flush(self) -> str:
+        """Release anything held back once the stream has ended."""
+        if self.in_think:
+            text = ""
+        elif self.after_think and self.buffer.startswith(BOLD):
+            text = self.buffer[len(BOLD):]
+        else:
+            text = self.buffer
+        self.buffer = ""
+        return self._emit(text).rstrip()
+
+    def _emit(self, text: str) -> str:
+        if not self.started:
+            text = text.lstrip()
+            if text:
+                self.started = True
+        return text
+
+
+def clean_thinker_section(raw: str) -> str:
+    # Remove <think>...</think> or **<think>...</think>** if present; like ThinkStripper,
+    # an unterminated block (the model ran out of tokens while reasoning) runs to the end
+    return re.sub(r"(\*\*)?<think>.*?(</think>(\*\*)?|$)", "", raw, flags=re.DOTALL).strip()
@@ -0,0 +1,578 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from os import getenv
+
+import faiss
+import numpy as np
+
+from index_engine import (INDEX_TYPE, LOSSY_TYPES, MMAP_TYPES, create_index, extract_vectors, index_kind, migrate_index,
+                          min_training_vectors, remove_ids, train_index, tune_index)
+
+# Snapshot once the log passes this size or age (whichever comes first)
+SNAPSHOT_LOG_BYTES = int(getenv("SNAPSHOT_LOG_BYTES", str(64 * 1024 * 1024)))
+SNAPSHOT_INTERVAL = float(getenv("SNAPSHOT_INTERVAL", "300"))
+
+# Compact once tombstones pass this count or fraction of the index
+COMPACT_MIN_TOMBSTONES = int(getenv("COMPACT_MIN_TOMBSTONES", "1000"))
+COMPACT_TOMBSTONE_RATIO = float(getenv("COMPACT_TOMBSTONE_RATIO", "0.1"))
+
+# Memory-map the snapshot (IVF kinds) so API workers share its pages; new vectors sit in a small delta until merged
+FAISS_MMAP = getenv("FAISS_MMAP", "0") == "1"
+# Re-score FAISS_RERANK_FACTOR * k candidates with exact float32 vectors kept in `<path>.vectors` (0 = off)
+FAISS_RERANK_FACTOR = int(getenv("FAISS_RERANK_FACTOR", "0"))
+
+# Log record: op, faiss id, crc32 of the payload, then the payload
+RECORD_HEADER = struct.Struct("<cqI")
+OP_ADD = b"A"
+OP_DELETE = b"D"
+OP_UNDELETE = b"U"
+
+
+class StoreLocked(RuntimeError):
+    """Another process has the store open; it allows one writer at a time."""
+
+
+def _fsync_dir(path):
+    # Make the rename itself durable; not supported on every platform
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class RawVectors:
+    """
+    Exact float32 vectors in a memory-mapped file, one row per FAISS id, used
+    to re-score candidates from a compressed index. Only the candidate rows
+    are read, and the pages are shared by every process mapping the file.
+    The vector log stays the source of truth; flush() happens with snapshots.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.created = not os.path.exists(path)
+        if self.created:
+            open(path, "wb").close()
+        self.rows = None
+        self._map()
+
+    def _map(self):
+        size = os.path.getsize(self.path) // (self.dim * 4)
+        self.rows = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(size, self.dim)) if size else None
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.rows is None else len(self.rows)
+
+    def write(self, ids: np.ndarray, vectors: np.ndarray):
+        if not len(ids):
+            return
+        needed = int(ids.max()) + 1
+        if needed > self.capacity:
+            # Grow geometrically so appends stay amortised O(1)
+            if self.rows is not None:
+                self.rows.flush()
+            with open(self.path, "r+b") as f:
+                f.truncate(max(needed, 2 * self.capacity, 1024) * self.dim * 4)
+            self._map()
+        self.rows[ids] = vectors
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.rows[ids])
+
+    def flush(self):
+        if self.rows is not None:
+            self.rows.flush()
+
+
+class IdAllocator:
+    """
+    Hands out FAISS ids from one sequence shared by several stores (the
+    collection shards), so an id names the same chunk whichever shard holds it.
+    """
+
+    def __init__(self):
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def reserve_above(self, faiss_id):
+        if faiss_id is not None:
+            with self.lock:
+                self.next_id = max(self.next_id, int(faiss_id) + 1)
+
+    def allocate(self, count: int, above: int = -1) -> int:
+        """First of `count` consecutive ids, all greater than `above`."""
+        with self.lock:
+            start = max(self.next_id, above + 1)
+            self.next_id = start + count
+            return start
+
+
+class VectorStore:
+    """
+    In-memory FAISS index that is authoritative for reads and writes.
+
+    Writes are appended to `<path>.log` and fsynced before they reach the
+    index, so a crash loses nothing that was acknowledged. The full index is
+    written out periodically as a snapshot (temp file + atomic rename), after
+    which the log is trimmed. On startup the snapshot is loaded and the log
+    replayed; a torn trailing record is discarded.
+
+    Deletes only tombstone ids: they are logged, filtered out of search
+    results and written next to the snapshot (`<path>.tombstones`). A
+    background compaction physically removes them once they pass
+    COMPACT_MIN_TOMBSTONES or COMPACT_TOMBSTONE_RATIO of the index.
+
+    With `mmap`, an IVF snapshot is memory-mapped read-only instead of being
+    copied into each process. Vectors added since go to an in-memory flat
+    `delta` that is searched alongside it; snapshots merge the delta (and
+    drop tombstones) into a new file, which is then mapped in its place.
+    With `rerank_factor`, searches over-fetch candidates and re-score them
+    against exact vectors in RawVectors.
+
+    With an `allocator`, new ids come from a sequence shared with other
+    stores instead of this store's own max id.
+    """
+
+    def __init__(self, path: str, dim: int, kind: str = INDEX_TYPE, mmap: bool = FAISS_MMAP,
+                 rerank_factor: int = FAISS_RERANK_FACTOR, allocator: IdAllocator = None):
+        self.path = path
+        self.log_path = path + ".log"
+        self.tombstone_path = path + ".tombstones"
+        self.dim = dim
+        self.kind = kind
+        self.mmap = mmap
+        self.rerank_factor = rerank_factor
+        self.allocator = allocator
+        self.lock = threading.RLock()
+        self.index = create_index(dim, kind)
+        self.delta = None  # set while the index is a read-only mapping
+        self.raw = None
+        self.max_id = -1
+        self.tombstones = set()
+        self._snapshot_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        self._log = None
+        self._lock_file = None
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal + (self.delta.ntotal if self.delta is not None else 0)
+
+    @property
+    def mapped(self) -> bool:
+        return self.delta is not None
+
+    # ---- Startup ----
+    def load(self):
+        with self.lock:
+            self._lock_store()
+            if os.path.exists(self.path):
+                index = faiss.read_index(self.path, faiss.IO_FLAG_MMAP if self.mmap else 0)
+                if not isinstance(index, faiss.IndexIDMap):
+                    # Legacy positional IndexFlatL2: keep positions as explicit ids
+                    index = migrate_index(index, self.dim, "flat")
+                    print("Migrated legacy FAISS index to flat inner-product with explicit ids")
+                elif self.mmap:
+                    if index_kind(index) in MMAP_TYPES:
+                        self.delta = create_index(self.dim, "flat")
+                    else:
+                        print(f"FAISS index is '{index_kind(index)}'; only IVF kinds can be memory-mapped, loaded into RAM")
+                tune_index(index)
+                self.index = index
+                print("FAISS index loaded with", index.ntotal, "entries", "(memory-mapped)" if self.mapped else "")
+                if index_kind(index) != self.kind:
+                    print(f"FAISS index is '{index_kind(index)}', configured '{self.kind}'; run rebuild_index.py to convert")
+            else:
+                print("No FAISS index found, using fresh one.")
+            if self.index.ntotal:
+                self.max_id = int(faiss.vector_to_array(self.index.id_map).max())
+            if os.path.exists(self.tombstone_path):
+                self.tombstones = set(np.load(self.tombstone_path).tolist())
+            if self.rerank_factor:
+                self._open_raw()
+            replayed = self._replay_log()
+            if replayed:
+                print(f"Replayed {replayed} vectors from {self.log_path}")
+            if self.allocator is not None:
+                self.allocator.reserve_above(self.max_id)
+            self._log = open(self.log_path, "ab")
+
+    def _lock_store(self):
+        # A second process would append to the same log, hand out the same ids, and trim or
+        # tombstone the other's records, so fail fast instead. The lock is on a file of its own
+        # because snapshots replace the log; it is held until close().
+        try:
+            import fcntl
+        except ImportError:  # not POSIX: no cross-process protection
+            return
+        if self._lock_file is not None:
+            return
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise StoreLocked(f"{self.path} is open in another process")
+        self._lock_file = lock_file
+
+    def _open_raw(self):
+        self.raw = RawVectors(self.path + ".vectors", self.dim)
+        if self.raw.created and self.index.ntotal:
+            # First run with re-scoring: seed from the index (approximate if it is compressed)
+            vectors, ids = extract_vectors(self.index)
+            if index_kind(self.index) in LOSSY_TYPES:
+                print("Seeding re-scoring vectors from a compressed index; rebuild_index.py --reembed restores exact ones")
+            self.raw.write(ids, vectors)
+            self.raw.flush()
+
+    def _replay_log(self) -> int:
+        if not os.path.exists(self.log_path):
+            return 0
+        snapshot_max = self.max_id
+        vector_size = self.dim * 4
+        replayed = 0
+        good_bytes = 0
+        with open(self.log_path, "rb") as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                op, faiss_id, crc = RECORD_HEADER.unpack(header)
+                if op not in (OP_ADD, OP_DELETE, OP_UNDELETE):
+                    break
+                payload_size = vector_size if op == OP_ADD else 0
+                payload = f.read(payload_size)
+                if len(payload) < payload_size or zlib.crc32(payload) != crc:
+                    break
+                good_bytes = f.tell()
+                # Deletes are idempotent and always re-applied
+                if op == OP_DELETE:
+                    self.tombstones.add(faiss_id)
+                    continue
+                if op == OP_UNDELETE:
+                    self.tombstones.discard(faiss_id)
+                    continue
+                # Ids are allocated in increasing order, so anything at or below
+                # the snapshot's max id is already in the snapshot
+                if faiss_id <= snapshot_max:
+                    continue
+                vector = np.frombuffer(payload, dtype=np.float32).reshape(1, self.dim)
+                self._add_to_index(vector, np.array([faiss_id], dtype=np.int64))
+                self.max_id = max(self.max_id, faiss_id)
+                replayed += 1
+        if good_bytes < os.path.getsize(self.log_path):
+            print(f"Discarding torn tail of {self.log_path} after {good_bytes} bytes")
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good_bytes)
+        return replayed
+
+    # ---- Reads ----
+    def search(self, queries: np.ndarray, k: int):
+        fetch = k * self.rerank_factor if self.raw is not None else k
+        with self.lock:
+            if not self.tombstones and self.raw is None:
+                return self._search_all(queries, k)
+            # Over-fetch by the tombstone count so k live hits always survive filtering
+            dead = self.tombstones.copy()
+            scores, ids = self._search_all(queries, fetch + len(dead))
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row in range(len(queries)):
+            live = [j for j, faiss_id in enumerate(ids[row]) if faiss_id != -1 and int(faiss_id) not in dead][:fetch]
+            row_ids = ids[row, live]
+            row_scores = scores[row, live]
+            if self.raw is not None and len(live):
+                # Exact inner products for the candidates, best first
+                row_scores = self.raw.get(row_ids) @ queries[row]
+                order = np.argsort(-row_scores)
+                row_ids, row_scores = row_ids[order], row_scores[order]
+            out_scores[row, :min(len(live), k)] = row_scores[:k]
+            out_ids[row, :min(len(live), k)] = row_ids[:k]
+        return out_scores, out_ids
+
+    def _search_all(self, queries: np.ndarray, k: int):
+        scores, ids = self.index.search(queries, k)
+        if not self.mapped or not self.delta.ntotal:
+            return scores, ids
+        # Merge hits from the mapped snapshot and the in-memory delta
+        delta_scores, delta_ids = self.delta.search(queries, k)
+        scores = np.hstack([scores, delta_scores])
+        ids = np.hstack([ids, delta_ids])
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def export(self):
+        """(vectors, ids) of every live vector: the index plus the mmap delta, minus tombstones."""
+        with self.lock:
+            vectors, ids = extract_vectors(self.index)
+            if self.mapped and self.delta.ntotal:
+                delta_vectors, delta_ids = extract_vectors(self.delta)
+                vectors, ids = np.vstack([vectors, delta_vectors]), np.concatenate([ids, delta_ids])
+            dead = np.array(sorted(self.tombstones), dtype=np.int64)
+        live = ~np.isin(ids, dead)
+        return np.ascontiguousarray(vectors[live]), ids[live]
+
+    # ---- Writes ----
+    def reserve_above(self, faiss_id):
+        """Make sure future ids are allocated above an id known elsewhere (e.g. the DB)."""
+        if faiss_id is not None:
+            with self.lock:
+                self.max_id = max(self.max_id, int(faiss_id))
+            if self.allocator is not None:
+                self.allocator.reserve_above(faiss_id)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Log and index vectors under freshly allocated ids, which are returned."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self.lock:
+            # Allocating inside the lock keeps ids increasing in log order,
+            # which replay relies on
+            start = self.max_id + 1 if self.allocator is None else self.allocator.allocate(len(vectors), self.max_id)
+            ids = np.arange(start, start + len(vectors), dtype=np.int64)
+            records = b"".join(
+                RECORD_HEADER.pack(OP_ADD, int(faiss_id), zlib.crc32(vector.tobytes())) + vector.tobytes()
+                for faiss_id, vector in zip(ids, vectors)
+            )
+            self._append(records)
+            self._add_to_index(vectors, ids)
+            self.max_id = int(ids[-1])
+        self.maybe_snapshot()
+        return ids
+
+    def remove(self, ids):
+        """
+        Tombstone ids; they disappear from search immediately and from memory
+        on compaction. Call maybe_compact() once the removal is committed, so
+        undelete() can still restore them until then.
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        records = b"".join(RECORD_HEADER.pack(OP_DELETE, i, zlib.crc32(b"")) for i in ids)
+        with self.lock:
+            self._append(records)
+            self.tombstones.update(ids)
+
+    def undelete(self, ids):
+        """Revert remove() for ids that have not been compacted yet (failed DB transaction)."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        records = b"".join(RECORD_HEADER.pack(OP_UNDELETE, i, zlib.crc32(b"")) for i in ids)
+        with self.lock:
+            self._append(records)
+            self.tombstones.difference_update(ids)
+
+    def _append(self, records: bytes):
+        self._log.write(records)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def _add_to_index(self, vectors, ids):
+        if self.raw is not None:
+            self.raw.write(ids, vectors)
+        if self.mapped:
+            # The mapped snapshot is read-only; adding to it would abort the process
+            self.delta.add_with_ids(vectors, ids)
+            return
+        if not self.index.is_trained:
+            if len(ids) >= min_training_vectors(self.index):
+                train_index(self.index, vectors)
+            else:
+                # Not enough data to train IVF centroids yet; stay exact until a rebuild
+                print(f"Too few vectors to train '{index_kind(self.index)}', using flat index; run rebuild_index.py later")
+                self.index = create_index(self.dim, "flat")
+        self.index.add_with_ids(vectors, ids)
+
+    # ---- Compaction ----
+    def maybe_compact(self):
+        dead = len(self.tombstones)
+        if dead < COMPACT_MIN_TOMBSTONES and dead < COMPACT_TOMBSTONE_RATIO * max(self.index.ntotal, 1):
+            return
+        if not self._compact_lock.locked():
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Physically drop tombstoned vectors, then snapshot."""
+        if self.mapped:
+            # Merging snapshots drop tombstones; the mapped file can't be edited in place
+            with self._compact_lock:
+                self.snapshot()
+            return
+        with self._compact_lock:
+            with self.lock:
+                dead = self.tombstones.copy()
+                if not dead:
+                    return
+                try:
+                    # Flat and IVF support removal in place
+                    remove_ids(self.index, np.array(sorted(dead), dtype=np.int64))
+                    self.tombstones -= dead
+                    rebuilt = True
+                except RuntimeError:
+                    # HNSW can't remove; rebuild from a copy outside the lock
+                    vectors, ids = extract_vectors(self.index)
+                    copied_max = self.max_id
+                    rebuilt = False
+            if not rebuilt:
+                keep = ~np.isin(ids, np.array(sorted(dead), dtype=np.int64))
+                new_index = create_index(self.dim, index_kind(self.index))
+                if keep.any():
+                    new_index.add_with_ids(vectors[keep], ids[keep])
+                with self.lock:
+                    # Carry over vectors added while the copy was being rebuilt
+                    if self.max_id > copied_max:
+                        new_ids = np.arange(copied_max + 1, self.max_id + 1, dtype=np.int64)
+                        new_ids = np.array([i for i in new_ids if self._contains(i)], dtype=np.int64)
+                        if len(new_ids):
+                            new_index.add_with_ids(np.vstack([self.index.reconstruct(int(i)) for i in new_ids]), new_ids)
+                    tune_index(new_index)
+                    self.index = new_index
+                    self.tombstones -= dead
+            print(f"Compacted FAISS index: removed {len(dead)} tombstoned vectors, {self.index.ntotal} remain")
+        self.snapshot()
+
+    def _contains(self, faiss_id: int) -> bool:
+        try:
+            self.index.reconstruct(int(faiss_id))
+            return True
+        except RuntimeError:
+            return False
+
+    # ---- Snapshots ----
+    def maybe_snapshot(self):
+        if self._log is None:
+            return
+        log_size = self._log.tell()
+        if log_size == 0:
+            return
+        due = log_size >= SNAPSHOT_LOG_BYTES or time.monotonic() - self._last_snapshot >= SNAPSHOT_INTERVAL
+        if due and not self._snapshot_lock.locked():
+            threading.Thread(target=self.snapshot, daemon=True).start()
+
+    def snapshot(self):
+        """Write the index atomically and trim the log records it now covers."""
+        if self.mapped:
+            return self._merge_snapshot()
+        with self._snapshot_lock:
+            with self.lock:
+                data = faiss.serialize_index(self.index)
+                tombstones = np.array(sorted(self.tombstones), dtype=np.int64)
+                covered = self._log.tell() if self._log else 0
+            # Tombstones first: stale entries for ids missing from the index are harmless
+            tmp_path = self.tombstone_path + ".tmp.npy"
+            np.save(tmp_path, tombstones)
+            os.replace(tmp_path, self.tombstone_path)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            _fsync_dir(self.path)
+            with self.lock:
+                self._trim_log(covered)
+            if self.raw is not None:
+                self.raw.flush()
+            self._last_snapshot = time.monotonic()
+
+    def _merge_snapshot(self):
+        """Snapshot for a mapped index: merge the delta into a copy of the file, then map the new file."""
+        with self._snapshot_lock:
+            with self.lock:
+                delta_vectors, delta_ids = extract_vectors(self.delta)
+                dead = self.tombstones.copy()
+                tombstones = np.array(sorted(dead), dtype=np.int64)
+                covered = self._log.tell() if self._log else 0
+            if not len(delta_ids) and not dead:
+                with self.lock:
+                    self._trim_log(covered)
+                self._last_snapshot = time.monotonic()
+                return
+            # Only the writer pays for a private copy, and only while merging
+            merged = faiss.read_index(self.path)
+            if len(delta_ids):
+                merged.add_with_ids(delta_vectors, delta_ids)
+            if dead:
+                remove_ids(merged, tombstones)
+            tmp_path = self.tombstone_path + ".tmp.npy"
+            np.save(tmp_path, tombstones)
+            os.replace(tmp_path, self.tombstone_path)
+            tmp_path = self.path + ".tmp"
+            faiss.write_index(merged, tmp_path)
+            del merged
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            _fsync_dir(self.path)
+            if self.raw is not None:
+                self.raw.flush()
+            with self.lock:
+                index = faiss.read_index(self.path, faiss.IO_FLAG_MMAP)
+                tune_index(index)
+                self.index = index
+                # Keep what arrived during the merge
+                if len(delta_ids):
+                    self.delta.remove_ids(faiss.IDSelectorBatch(delta_ids))
+                self.tombstones -= dead
+                self._trim_log(covered)
+            self._last_snapshot = time.monotonic()
+
+    def _trim_log(self, covered: int):
+        # Keep records appended while the snapshot was being written
+        if self._log is None:
+            return
+        self._log.close()
+        with open(self.log_path, "rb") as f:
+            f.seek(covered)
+            tail = f.read()
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_path)
+        _fsync_dir(self.log_path)
+        self._log = open(self.log_path, "ab")
+
+    def swap(self, index, vectors: np.ndarray = None, ids: np.ndarray = None):
+        """
+        Replace the whole index (e.g. after a rebuild) and persist it. Pass the
+        exact vectors when re-scoring is on, so they replace seeded ones.
+        """
+        with self.lock:
+            tune_index(index)
+            # Ids deleted since the vectors were copied are still dead in the new index
+            live = set(faiss.vector_to_array(index.id_map).tolist()) if index.ntotal else set()
+            self.index = index
+            self.delta = None
+            self.tombstones &= live
+            if self.raw is not None and vectors is not None:
+                self.raw.write(ids, vectors)
+            if index.ntotal:
+                self.max_id = max(self.max_id, int(faiss.vector_to_array(index.id_map).max()))
+        self.snapshot()
+
+    def close(self):
+        if self._log is not None:
+            self.snapshot()
+            with self.lock:
+                self._log.close()
+                self._log = None
+        if self.raw is not None:
+            self.raw.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None